@@ -1,36 +1,43 @@
-from typing import Generator, List
-from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..database import SessionLocal
+from typing import AsyncGenerator, List
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import AsyncSessionLocal
 from ..core.security import oauth2_scheme
 from ..core.config import settings
+from ..core.rate_limit import rate_limiter, rate_limit_headers
 from ..models.user import User
 from ..models.enums import UserRole
+from ..schemas.user import UserPrincipal
+from ..cache.principal_cache import principal_cache
 import jwt
-from redis import Redis
 from datetime import datetime, timedelta
-import time
 
-# Redis connection
-redis = Redis.from_url(settings.REDIS_URL)
-
-def get_db() -> Generator:
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 async def get_current_user(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme)
-) -> User:
+) -> UserPrincipal:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        user = db.query(User).filter(User.username == payload["sub"]).first()
+        subject = payload["sub"]
+        expires_at = payload.get("exp")
+
+        principal = await principal_cache.get(subject, expires_at)
+        if principal is not None:
+            return principal
+
+        result = await db.execute(select(User).where(User.username == subject))
+        user = result.scalars().first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        return user
+
+        principal = UserPrincipal.model_validate(user)
+        await principal_cache.set(subject, principal, expires_at)
+        return principal
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -45,8 +52,8 @@ async def get_current_user(
         )
 
 def check_admin_access(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: UserPrincipal = Depends(get_current_user),
+) -> UserPrincipal:
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=403,
@@ -54,20 +61,50 @@ def check_admin_access(
         )
     return current_user
 
-def rate_limit(calls: int, period: timedelta):
-    async def decorator(user: User = Depends(get_current_user)):
-        key = f"rate_limit:{user.id}"
-        current = redis.get(key)
-        
-        if current is None:
-            redis.setex(key, period.seconds, 1)
-        elif int(current) >= calls:
-            raise HTTPException(
-                status_code=429,
-                detail="Too many requests"
+def get_client_ip(request: Request) -> str:
+    # Only a header our own proxy overwrites can be trusted. X-Forwarded-For
+    # is passed through from the client, so rotating it would dodge per-IP limits.
+    if settings.CLIENT_IP_HEADER:
+        client_ip = request.headers.get(settings.CLIENT_IP_HEADER)
+        if client_ip:
+            return client_ip.strip()
+    return request.client.host if request.client else "unknown"
+
+async def _enforce_rate_limit(
+    request: Request,
+    response: Response,
+    identity: str,
+    calls: int,
+    period: timedelta
+) -> None:
+    route = request.scope.get("route")
+    path = getattr(route, "path", request.url.path)
+    key = f"rate_limit:{identity}:{path}"
+
+    result = await rate_limiter.hit(key, calls, period.total_seconds())
+    headers = rate_limit_headers(result)
+    if not result.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers=headers
+        )
+    response.headers.update(headers)
+
+def rate_limit(calls: int, period: timedelta, per_ip: bool = False):
+    # Authenticated routes are limited per user, unauthenticated ones per IP
+    if per_ip:
+        async def ip_rate_limit(request: Request, response: Response):
+            await _enforce_rate_limit(
+                request, response, f"ip:{get_client_ip(request)}", calls, period
             )
-        else:
-            redis.incr(key)
-        
+        return ip_rate_limit
+
+    async def user_rate_limit(
+        request: Request,
+        response: Response,
+        user: UserPrincipal = Depends(get_current_user)
+    ) -> UserPrincipal:
+        await _enforce_rate_limit(request, response, f"user:{user.id}", calls, period)
         return user
-    return decorator
+    return user_rate_limit
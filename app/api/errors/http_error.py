@@ -12,5 +12,6 @@ async def http_error_handler(request: Request, exc: Union[HTTPException, Starlet
                 "message": exc.detail,
                 "type": "http_error"
             }
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from .endpoints import auth, users, profiles, files, health
+from .endpoints import auth, users, profiles, files, health, websocket
 
 api_router = APIRouter()
 
@@ -8,3 +8,4 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(profiles.router, prefix="/profiles", tags=["profiles"])
 api_router.include_router(files.router, prefix="/files", tags=["files"])
 api_router.include_router(health.router, prefix="/health", tags=["health"])
+api_router.include_router(websocket.router, tags=["websocket"])
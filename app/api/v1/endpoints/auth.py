@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ....core.config import settings
 from ....core import security
 from ....schemas import user as user_schema
 from ....models import user as user_model
 from ....api import deps
 from ....services import email as email_service
+from ....cache.principal_cache import principal_cache
 from fastapi.security import OAuth2PasswordBearer
 from datetime import timedelta
 
@@ -15,22 +17,25 @@ router = APIRouter()
 async def register(
     user: user_schema.UserCreate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(deps.get_db)
+    db: AsyncSession = Depends(deps.get_db)
 ):
     # Check existing user
-    if db.query(user_model.User).filter(user_model.User.email == user.email).first():
+    result = await db.execute(
+        select(user_model.User).where(user_model.User.email == user.email)
+    )
+    if result.scalars().first():
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
     db_user = user_model.User(
         email=user.email,
         username=user.username,
-        hashed_password=security.get_password_hash(user.password),
+        hashed_password=await security.get_password_hash_async(user.password),
         is_active=False
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Send verification email
     verification_token = security.create_email_verification_token(db_user)
@@ -43,28 +48,59 @@ async def register(
     return db_user
 
 # ...existing login endpoint with rate limiting...
-@router.post("/login", response_model=user_schema.Token)
-@deps.rate_limit(calls=5, period=timedelta(minutes=5))
+@router.post(
+    "/login",
+    response_model=user_schema.Token,
+    dependencies=[Depends(deps.rate_limit(calls=5, period=timedelta(minutes=5), per_ip=True))]
+)
 async def login(
     response: Response,
     credentials: user_schema.UserLogin,
-    db: Session = Depends(deps.get_db)
+    db: AsyncSession = Depends(deps.get_db)
 ):
-    # ...existing login code...
+    result = await db.execute(
+        select(user_model.User).where(user_model.User.username == credentials.username)
+    )
+    db_user = result.scalars().first()
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    verified, new_hash = await security.verify_and_update_password(
+        credentials.password, db_user.hashed_password
+    )
+    if not verified:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    # Transparently upgrade hashes created with an older cost factor
+    if new_hash:
+        db_user.hashed_password = new_hash
+        await db.commit()
+    
+    access_token = security.create_access_token(db_user.username)
+    refresh_token = security.create_refresh_token(db_user.username)
+    
+    response.set_cookie(key="access_token", value=access_token, httponly=True)
+    response.set_cookie(key="refresh_token", value=refresh_token, httponly=True)
+    
+    return {"access_token": access_token, "refresh_token": refresh_token}
 
 # New endpoint for email verification
 @router.get("/verify-email/{token}")
-async def verify_email(token: str, db: Session = Depends(deps.get_db)):
+async def verify_email(token: str, db: AsyncSession = Depends(deps.get_db)):
     email = security.verify_email_token(token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid verification token")
     
-    user = db.query(user_model.User).filter(user_model.User.email == email).first()
+    result = await db.execute(
+        select(user_model.User).where(user_model.User.email == email)
+    )
+    user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     user.is_active = True
-    db.commit()
+    await db.commit()
+    await principal_cache.invalidate(user.username)
     return {"message": "Email verified successfully"}
 
 # Password reset endpoints
@@ -72,9 +108,12 @@ async def verify_email(token: str, db: Session = Depends(deps.get_db)):
 async def forgot_password(
     email: user_schema.EmailSchema,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(deps.get_db)
+    db: AsyncSession = Depends(deps.get_db)
 ):
-    user = db.query(user_model.User).filter(user_model.User.email == email.email).first()
+    result = await db.execute(
+        select(user_model.User).where(user_model.User.email == email.email)
+    )
+    user = result.scalars().first()
     if user:
         reset_token = security.create_password_reset_token(user)
         background_tasks.add_task(
@@ -88,16 +127,20 @@ async def forgot_password(
 async def reset_password(
     token: str,
     new_password: user_schema.PasswordReset,
-    db: Session = Depends(deps.get_db)
+    db: AsyncSession = Depends(deps.get_db)
 ):
     email = security.verify_password_reset_token(token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid reset token")
     
-    user = db.query(user_model.User).filter(user_model.User.email == email).first()
+    result = await db.execute(
+        select(user_model.User).where(user_model.User.email == email)
+    )
+    user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user.hashed_password = security.get_password_hash(new_password.new_password)
-    db.commit()
+    user.hashed_password = await security.get_password_hash_async(new_password.new_password)
+    await db.commit()
+    await principal_cache.invalidate(user.username)
     return {"message": "Password updated successfully"}
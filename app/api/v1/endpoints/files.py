@@ -1,83 +1,405 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import ARRAY, Integer, any_, bindparam, delete, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from ....api import deps
-from ....models import User, File as FileModel
+from ....schemas.user import UserPrincipal
+from ....models.file import File as FileModel
 from ....schemas import file as file_schema
-from ....services.s3 import S3Service
+from ....storage.factory import get_storage
+from ....services.upload import HashingStream, UploadStream
+from ....services.blob_store import blob_store
+from ....services.images import IMAGE_TYPES, configured_variant_keys, variant_keys
+from ....tasks.worker import upload_batcher
 from ....core.config import settings
-from typing import List
-import aiofiles
-import os
+from ....cache.redis_cache import cache, cached, tags_by_user, user_tag
+from ....utils.pagination import decode_cursor, encode_cursor
+from collections import Counter
+from typing import List, Optional
 
 router = APIRouter()
-s3_service = S3Service()
+storage = get_storage()
 
-@router.post("/upload", response_model=file_schema.FileInDB)
+@router.post(
+    "/upload",
+    response_model=file_schema.FileInDB,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
 async def upload_file(
-    file: UploadFile = File(...),
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    request: Request,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    # Validate file size
-    file.file.seek(0, os.SEEK_END)
-    file_size = file.file.tell()
-    file.file.seek(0)
+    # The body is streamed straight to storage instead of being spooled by
+    # UploadFile; size and sniffed content type are checked as bytes arrive
+    upload = UploadStream(request)
+    await upload.start()
     
-    if file_size > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(status_code=400, detail="File too large")
+    # Hashed on the way through; identical content collapses onto one blob
+    hashed = HashingStream(upload)
+    key = storage.build_key("blobs", upload.filename)
+    await storage.save_stream(hashed, key, upload.content_type)
+    try:
+        blob, created = await blob_store.acquire(
+            db, hashed.hexdigest(), key, upload.size, upload.content_type
+        )
+        
+        # Create file record
+        db_file = FileModel(
+            filename=upload.filename,
+            file_type="DOCUMENT" if upload.content_type == "application/pdf" else "IMAGE",
+            file_url=storage.url_for(blob.storage_key),
+            mime_type=upload.content_type,
+            size=upload.size,
+            user_id=current_user.id,
+            blob_id=blob.id
+        )
         
-    if file.content_type not in settings.ALLOWED_FILE_TYPES:
+        db.add(db_file)
+        await db.commit()
+    except BaseException:
+        # Nothing references the new object until the commit lands
+        await db.rollback()
+        await storage.delete(key)
+        raise
+    await db.refresh(db_file)
+    if not created:
+        await storage.delete(key)
+    await cache.invalidate_tags(user_tag(current_user.id, "files"))
+    if upload.content_type in IMAGE_TYPES:
+        upload_batcher.add(db_file.id)
+    
+    return db_file
+
+@router.post("/dedupe", response_model=file_schema.FileInDB)
+async def dedupe_upload(
+    dedupe: file_schema.DedupeUpload,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    # Completes a re-upload from its SHA-256 alone, with no bytes transferred.
+    # A 404 means the client should fall back to POST /upload.
+    blob = await blob_store.find_owned(db, dedupe.sha256, current_user.id)
+    if not blob:
+        raise HTTPException(status_code=404, detail="Content not found")
+    
+    blob = await blob_store.reference(db, blob)
+    if not blob:
+        raise HTTPException(status_code=404, detail="Content not found")
+    
+    db_file = FileModel(
+        filename=dedupe.filename,
+        file_type="DOCUMENT" if blob.mime_type == "application/pdf" else "IMAGE",
+        file_url=storage.url_for(blob.storage_key),
+        mime_type=blob.mime_type,
+        size=blob.size,
+        user_id=current_user.id,
+        blob_id=blob.id
+    )
+    
+    db.add(db_file)
+    await db.commit()
+    await db.refresh(db_file)
+    await cache.invalidate_tags(user_tag(current_user.id, "files"))
+    
+    return db_file
+
+@router.post("/presign", response_model=file_schema.PresignedUpload)
+async def presign_upload(
+    presign: file_schema.PresignUploadRequest,
+    current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    # Lets clients upload straight to S3; the bytes never touch the API pods
+    if not storage.supports_presigned:
+        raise HTTPException(status_code=400, detail="Direct uploads are not supported")
+    if presign.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=400, detail="File too large")
+    if presign.content_type not in settings.ALLOWED_FILE_TYPES:
         raise HTTPException(status_code=400, detail="File type not allowed")
     
-    # Upload to S3
-    file_url = await s3_service.upload_file(file)
+    key = storage.build_key(f"uploads/{current_user.id}", presign.filename)
+    presigned = await storage.presign_upload(
+        key, presign.content_type, settings.MAX_UPLOAD_SIZE
+    )
+    return {
+        "url": presigned["url"],
+        "fields": presigned["fields"],
+        "key": key,
+        "expires_in": settings.PRESIGNED_URL_EXPIRE_SECONDS
+    }
+
+@router.post("/complete", response_model=file_schema.FileInDB)
+async def complete_upload(
+    upload: file_schema.UploadComplete,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    if not storage.supports_presigned:
+        raise HTTPException(status_code=400, detail="Direct uploads are not supported")
+    # Keys are scoped per user so nobody can claim someone else's upload
+    if not upload.key.startswith(f"uploads/{current_user.id}/"):
+        raise HTTPException(status_code=403, detail="Not your upload")
+    
+    file_url = storage.url_for(upload.key)
+    result = await db.execute(select(FileModel).where(FileModel.file_url == file_url))
+    existing = result.scalars().first()
+    if existing:
+        return existing
+    
+    try:
+        size, content_type = await storage.verify_upload(
+            upload.key, settings.ALLOWED_FILE_TYPES, settings.MAX_UPLOAD_SIZE
+        )
+    except ValueError as e:
+        await storage.delete(upload.key)
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Create file record
     db_file = FileModel(
-        filename=file.filename,
-        file_type="DOCUMENT" if file.content_type == "application/pdf" else "IMAGE",
+        filename=upload.filename,
+        file_type="DOCUMENT" if content_type == "application/pdf" else "IMAGE",
         file_url=file_url,
-        mime_type=file.content_type,
-        size=file_size,
+        mime_type=content_type,
+        size=size,
         user_id=current_user.id
     )
     
     db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
+    await db.commit()
+    await db.refresh(db_file)
+    await cache.invalidate_tags(user_tag(current_user.id, "files"))
+    if content_type in IMAGE_TYPES:
+        upload_batcher.add(db_file.id)
     
     return db_file
 
+def _file_page_key(*args, current_user, skip, cursor, limit, **kwargs) -> str:
+    return f"user:{current_user.id}:{skip}:{cursor}:{limit}"
+
+@cached(
+    ttl=300,
+    key_builder=_file_page_key,
+    response_model=file_schema.FilePage,
+    tags=tags_by_user("files")
+)
+async def _list_files_page(
+    current_user: UserPrincipal,
+    skip: int,
+    cursor: Optional[str],
+    limit: int,
+    db: AsyncSession
+) -> dict:
+    query = select(FileModel).where(
+        FileModel.user_id == current_user.id
+    ).order_by(FileModel.created_at.desc(), FileModel.id.desc())
+
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(
+            tuple_(FileModel.created_at, FileModel.id) < tuple_(
+                created_at, last_id, types=[FileModel.created_at.type, FileModel.id.type]
+            )
+        )
+    else:
+        query = query.offset(skip)
+
+    # One extra row tells us whether there is a next page
+    result = await db.execute(query.limit(limit + 1))
+    files = result.scalars().all()
+
+    next_cursor = None
+    if len(files) > limit:
+        files = files[:limit]
+        next_cursor = encode_cursor(files[-1].created_at, files[-1].id)
+    return {"items": files, "next_cursor": next_cursor}
+
 @router.get("/", response_model=List[file_schema.FileInDB])
 async def list_files(
+    request: Request,
+    response: Response,
     skip: int = 0,
+    cursor: Optional[str] = None,
     limit: int = 10,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    files = db.query(FileModel).filter(
-        FileModel.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
-    return files
+    # skip/limit keeps working; pass the returned cursor for constant-cost paging
+    page = await _list_files_page(
+        current_user=current_user, skip=skip, cursor=cursor, limit=limit, db=db
+    )
+    if page.next_cursor:
+        next_url = request.url.remove_query_params("skip").include_query_params(
+            cursor=page.next_cursor, limit=limit
+        )
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page.items
+
+def _bulk_ids(bulk: file_schema.BulkFileIds) -> List[int]:
+    ids = list(dict.fromkeys(bulk.ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="No ids given")
+    if len(ids) > settings.FILE_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.FILE_BULK_MAX_ITEMS} ids per request"
+        )
+    return ids
+
+def _id_filter(db: AsyncSession, ids: List[int]):
+    # PostgreSQL gets a single array parameter, so the statement (and its
+    # prepared plan) is the same whatever the number of ids
+    if db.bind.dialect.name == "postgresql":
+        return FileModel.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+    return FileModel.id.in_(ids)
+
+@router.post("/bulk/fetch", response_model=file_schema.BulkFetchResult)
+async def bulk_fetch_files(
+    bulk: file_schema.BulkFileIds,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    ids = _bulk_ids(bulk)
+    result = await db.execute(
+        select(FileModel).where(_id_filter(db, ids), FileModel.user_id == current_user.id)
+    )
+    files = {file.id: file for file in result.scalars()}
+    return {
+        "items": [files[file_id] for file_id in ids if file_id in files],
+        "missing": [file_id for file_id in ids if file_id not in files]
+    }
+
+@router.post("/bulk/delete", response_model=file_schema.BulkDeleteResult)
+async def bulk_delete_files(
+    bulk: file_schema.BulkFileIds,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    # One query to load, batched storage deletes and a single transaction,
+    # instead of a query, storage call and commit per file
+    ids = _bulk_ids(bulk)
+    result = await db.execute(
+        select(FileModel).where(_id_filter(db, ids), FileModel.user_id == current_user.id)
+    )
+    files = {file.id: file for file in result.scalars()}
+    statuses = {file_id: ("not_found", "File not found") for file_id in ids if file_id not in files}
+
+    # Files that own their object are only removed once the object is gone,
+    # like delete_file does
+    legacy = [file for file in files.values() if file.blob_id is None]
+    removed = await storage.delete_many([storage.key_from_url(file.file_url) for file in legacy])
+    for file in legacy:
+        if not removed.get(storage.key_from_url(file.file_url)):
+            statuses[file.id] = ("error", "Error deleting file")
+
+    deleted = [file for file in files.values() if file.id not in statuses]
+    if deleted:
+        await db.execute(
+            delete(FileModel).where(_id_filter(db, [file.id for file in deleted])),
+            execution_options={"synchronize_session": False}
+        )
+        orphaned_keys = await blob_store.release_many(
+            db, dict(Counter(file.blob_id for file in deleted if file.blob_id is not None))
+        )
+        await db.commit()
+
+        # Leftover objects only waste space, so they go after the commit.
+        # Variants of a shared blob belong to every file using it, so they
+        # only go with the blob, as in delete_file.
+        orphaned = set(orphaned_keys)
+        garbage = set(orphaned_keys)
+        for key in orphaned_keys:
+            garbage.update(configured_variant_keys(key))
+        for file in deleted:
+            if file.blob_id is None or storage.key_from_url(file.file_url) in orphaned:
+                garbage.update(variant_keys(storage, file.variants))
+        await storage.delete_many(garbage)
+        await cache.invalidate_tags(user_tag(current_user.id, "files"))
+
+    for file in deleted:
+        statuses[file.id] = ("deleted", None)
+    return {
+        "results": [
+            {"id": file_id, "status": statuses[file_id][0], "detail": statuses[file_id][1]}
+            for file_id in ids
+        ]
+    }
+
+@router.get("/{file_id}/download")
+async def download_file(
+    file_id: int,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    result = await db.execute(
+        select(FileModel).where(
+            FileModel.id == file_id,
+            FileModel.user_id == current_user.id
+        )
+    )
+    file = result.scalars().first()
+    
+    if not file:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    # S3 redirects to a presigned URL, local disk is served with Range support
+    return await storage.download_response(
+        storage.key_from_url(file.file_url), file.filename, file.mime_type
+    )
 
 @router.delete("/{file_id}")
 async def delete_file(
     file_id: int,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    file = db.query(FileModel).filter(
-        FileModel.id == file_id,
-        FileModel.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(FileModel).where(
+            FileModel.id == file_id,
+            FileModel.user_id == current_user.id
+        )
+    )
+    file = result.scalars().first()
     
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Delete from S3
-    if await s3_service.delete_file(file.file_url):
-        db.delete(file)
-        db.commit()
-        return {"message": "File deleted successfully"}
+    # Files backed by a shared blob only remove the object with the last
+    # reference; older rows own their object outright
+    if file.blob_id is None:
+        key = storage.key_from_url(file.file_url)
+        if not await storage.delete(key):
+            raise HTTPException(status_code=500, detail="Error deleting file")
+        await db.delete(file)
+        await db.commit()
+        await storage.delete_many(variant_keys(storage, file.variants))
+    else:
+        blob_id = file.blob_id
+        await db.delete(file)
+        await db.flush()
+        orphaned_key = await blob_store.release(db, blob_id)
+        await db.commit()
+        if orphaned_key:
+            # Variant keys are derived from the blob, whichever file recorded them
+            await storage.delete_many({
+                orphaned_key,
+                *configured_variant_keys(orphaned_key),
+                *variant_keys(storage, file.variants)
+            })
     
-    raise HTTPException(status_code=500, detail="Error deleting file")
+    await cache.invalidate_tags(user_tag(current_user.id, "files"))
+    return {"message": "File deleted successfully"}
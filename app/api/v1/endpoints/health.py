@@ -1,15 +1,13 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from ....api import deps
-from redis import Redis
-from ....core.config import settings
+from ....core.redis_client import redis_client
 
 router = APIRouter()
-redis = Redis.from_url(settings.REDIS_URL)
 
 @router.get("/")
-async def health_check(db: Session = Depends(deps.get_db)):
+async def health_check(db: AsyncSession = Depends(deps.get_db)):
     health_status = {
         "status": "healthy",
         "services": {
@@ -21,14 +19,14 @@ async def health_check(db: Session = Depends(deps.get_db)):
     
     # Check database
     try:
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         health_status["services"]["database"] = "healthy"
     except Exception:
         health_status["status"] = "unhealthy"
     
     # Check Redis
     try:
-        redis.ping()
+        await redis_client.ping()
         health_status["services"]["redis"] = "healthy"
     except Exception:
         health_status["status"] = "unhealthy"
@@ -1,72 +1,147 @@
 from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ....schemas import profile as profile_schema
-from ....models import Profile, User
+from ....schemas import file as file_schema
+from ....models.profile import Profile
+from ....schemas.user import UserPrincipal
 from ....api import deps
-from ....services.s3 import S3Service
+from ....storage.factory import get_storage
+from ....cache.redis_cache import cache, cached, key_by_user, tags_by_user, user_tag
 from ....core.config import settings
+from ....tasks.worker import enqueue, process_avatar
 
 router = APIRouter()
-s3_service = S3Service()
+storage = get_storage()
+
+AVATAR_TYPES = ["image/jpeg", "image/png"]
 
 @router.post("/", response_model=profile_schema.ProfileInDB)
 async def create_profile(
     profile: profile_schema.ProfileCreate,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    if db.query(Profile).filter(Profile.user_id == current_user.id).first():
+    result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
+    if result.scalars().first():
         raise HTTPException(status_code=400, detail="Profile already exists")
     
     db_profile = Profile(**profile.dict(), user_id=current_user.id)
     db.add(db_profile)
-    db.commit()
-    db.refresh(db_profile)
+    await db.commit()
+    await db.refresh(db_profile)
+    await cache.invalidate_tags(user_tag(current_user.id, "profile"))
     return db_profile
 
 @router.put("/me", response_model=profile_schema.ProfileInDB)
 async def update_profile(
     profile: profile_schema.ProfileUpdate,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    db_profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
+    db_profile = result.scalars().first()
     if not db_profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
     for key, value in profile.dict(exclude_unset=True).items():
         setattr(db_profile, key, value)
     
-    db.commit()
-    db.refresh(db_profile)
+    await db.commit()
+    await db.refresh(db_profile)
+    await cache.invalidate_tags(user_tag(current_user.id, "profile"))
     return db_profile
 
 @router.put("/avatar")
 async def update_avatar(
     file: UploadFile = File(...),
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
 ):
-    if file.content_type not in ["image/jpeg", "image/png"]:
+    if file.content_type not in AVATAR_TYPES:
         raise HTTPException(status_code=400, detail="Invalid file type")
     
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
+    profile = result.scalars().first()
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    avatar_url = await s3_service.upload_file(file, "avatars")
+    avatar_url = await storage.save_file(file, "avatars")
     profile.avatar_url = avatar_url
-    db.commit()
+    profile.avatar_variants = None
+    await db.commit()
+    await cache.invalidate_tags(user_tag(current_user.id, "profile"))
+    # Resized copies are filled in by the worker; clients fall back to avatar_url
+    await enqueue(process_avatar, profile.id)
     
     return {"avatar_url": avatar_url}
 
+@router.post("/avatar/presign", response_model=file_schema.PresignedUpload)
+async def presign_avatar(
+    presign: file_schema.PresignUploadRequest,
+    current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    if not storage.supports_presigned:
+        raise HTTPException(status_code=400, detail="Direct uploads are not supported")
+    if presign.content_type not in AVATAR_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    if presign.size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=400, detail="File too large")
+    
+    key = storage.build_key(f"avatars/{current_user.id}", presign.filename)
+    presigned = await storage.presign_upload(
+        key, presign.content_type, settings.MAX_UPLOAD_SIZE
+    )
+    return {
+        "url": presigned["url"],
+        "fields": presigned["fields"],
+        "key": key,
+        "expires_in": settings.PRESIGNED_URL_EXPIRE_SECONDS
+    }
+
+@router.post("/avatar/complete")
+async def complete_avatar(
+    upload: file_schema.UploadComplete,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: UserPrincipal = Depends(deps.get_current_user)
+):
+    if not storage.supports_presigned:
+        raise HTTPException(status_code=400, detail="Direct uploads are not supported")
+    if not upload.key.startswith(f"avatars/{current_user.id}/"):
+        raise HTTPException(status_code=403, detail="Not your upload")
+    
+    result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
+    profile = result.scalars().first()
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    try:
+        await storage.verify_upload(upload.key, AVATAR_TYPES, settings.MAX_UPLOAD_SIZE)
+    except ValueError as e:
+        await storage.delete(upload.key)
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    profile.avatar_url = storage.url_for(upload.key)
+    profile.avatar_variants = None
+    await db.commit()
+    await cache.invalidate_tags(user_tag(current_user.id, "profile"))
+    await enqueue(process_avatar, profile.id)
+    
+    return {"avatar_url": profile.avatar_url}
+
 @router.get("/me", response_model=profile_schema.ProfileInDB)
-@cached(ttl=300)  # Cache for 5 minutes
+@cached(
+    ttl=300,  # Cache for 5 minutes
+    key_builder=key_by_user,
+    response_model=profile_schema.ProfileInDB,
+    tags=tags_by_user("profile")
+)
 async def get_my_profile(
-    current_user: User = Depends(deps.get_current_user),
-    db: Session = Depends(deps.get_db)
+    current_user: UserPrincipal = Depends(deps.get_current_user),
+    db: AsyncSession = Depends(deps.get_db)
 ):
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    result = await db.execute(select(Profile).where(Profile.user_id == current_user.id))
+    profile = result.scalars().first()
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
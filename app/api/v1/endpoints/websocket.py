@@ -1,35 +1,82 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from typing import Optional
 from ....websockets.connection import manager
 from ....api.deps import get_current_user
-from ....models.user import User
-from sqlalchemy.orm import Session
-from ....api.deps import get_db
+from ....database import AsyncSessionLocal
+from ....schemas.user import UserPrincipal
 import json
 
 router = APIRouter()
 
-@router.websocket("/ws/{client_id}")
+PONG_MESSAGE = json.dumps({"type": "pong"})
+
+async def authenticate_websocket(websocket: WebSocket, token: Optional[str]) -> Optional[UserPrincipal]:
+    # Browsers can't set headers on the handshake, so the token may come as
+    # ?token=; the session is closed before the socket is accepted so open
+    # sockets never hold a database connection
+    if not token:
+        authorization = websocket.headers.get("authorization", "")
+        scheme, _, credentials = authorization.partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if not token:
+        return None
+    try:
+        async with AsyncSessionLocal() as db:
+            user = await get_current_user(db=db, token=token)
+    except HTTPException:
+        return None
+    return user if user.is_active else None
+
+async def reject(websocket: WebSocket, code: int) -> None:
+    # Closing before accept() becomes an HTTP 403 on the handshake, so the
+    # close code would never reach the client; accept first to deliver it
+    await websocket.accept()
+    await websocket.close(code=code)
+
+@router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket,
-    client_id: int,
-    db: Session = Depends(get_db)
+    token: Optional[str] = Query(None)
 ):
-    user = await get_current_user(db=db, token=client_id)
-    await manager.connect(websocket, user.id)
+    user = await authenticate_websocket(websocket, token)
+    if user is None:
+        await reject(websocket, status.WS_1008_POLICY_VIOLATION)
+        return
+    if manager.at_capacity():
+        await reject(websocket, status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    # Clients may offer the msgpack.batch or json.batch subprotocol; plain
+    # clients keep one JSON text message per frame
+    connection = await manager.connect(websocket, user.id)
     try:
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            # Handle different message types
-            if message.get("type") == "chat":
-                await manager.send_personal_message(
-                    json.dumps({
-                        "type": "chat",
-                        "from": user.username,
-                        "content": message.get("content")
-                    }),
-                    user.id
-                )
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            try:
+                messages = connection.codec.decode(frame.get("bytes") or frame.get("text") or "")
+            except (ValueError, TypeError):
+                continue
+            for message in messages:
+                if not isinstance(message, dict):
+                    continue
+                # Handle different message types; "ping" is an optional
+                # application-level echo, liveness itself uses protocol pings
+                if message.get("type") == "ping":
+                    connection.send(PONG_MESSAGE)
+                elif message.get("type") == "chat":
+                    await manager.send_personal_message(
+                        {
+                            "type": "chat",
+                            "from": user.username,
+                            "content": message.get("content")
+                        },
+                        user.id
+                    )
     except WebSocketDisconnect:
-        manager.disconnect(websocket, user.id)
-        await manager.broadcast(f"Client #{client_id} left the chat")
+        pass
+    finally:
+        # Also on unexpected errors, so others still see the user leave
+        await manager.disconnect(websocket, user.id)
+        await manager.broadcast({"type": "left", "user": user.username})
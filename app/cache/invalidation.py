@@ -0,0 +1,83 @@
+from typing import Callable, List, Optional
+from uuid import uuid4
+import asyncio
+import json
+import logging
+from redis.asyncio import Redis
+from ..core.config import settings
+from ..core.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Wildcard passed to handlers when messages may have been missed
+ALL_KEYS = "*"
+
+# Broadcasts "drop these keys" messages to every pod over Redis pub/sub so
+# in-process caches stay coherent after writes made elsewhere.
+class InvalidationBus:
+    def __init__(self, redis: Redis, channel: str):
+        self.redis = redis
+        self.channel = channel
+        self.instance_id = uuid4().hex
+        self._handlers: List[Callable[[str], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add_handler(self, handler: Callable[[str], None]) -> None:
+        self._handlers.append(handler)
+
+    def message(self, *keys: str) -> str:
+        return json.dumps({"sender": self.instance_id, "keys": list(keys)})
+
+    async def publish(self, *keys: str) -> None:
+        if not keys:
+            return
+        try:
+            await self.redis.publish(self.channel, self.message(*keys))
+        except Exception as e:
+            logger.error(f"Cache invalidation publish error: {e}")
+
+    def _dispatch(self, key: str) -> None:
+        for handler in self._handlers:
+            try:
+                handler(key)
+            except Exception as e:
+                logger.error(f"Cache invalidation handler error: {e}")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Anything cached while we weren't listening may be stale
+                self._dispatch(ALL_KEYS)
+                async for message in pubsub.listen():
+                    payload = json.loads(message["data"])
+                    if payload["sender"] == self.instance_id:
+                        continue
+                    for key in payload["keys"]:
+                        self._dispatch(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+invalidation_bus = InvalidationBus(redis_client, settings.CACHE_INVALIDATION_CHANNEL)
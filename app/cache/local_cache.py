@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import time
+
+# Bounded in-process LRU holding serialized values. Storing bytes keeps the
+# byte budget exact and means callers never share mutable objects.
+class LocalCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        deadline, data = entry
+        if deadline <= time.monotonic():
+            self.delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def set(self, key: str, data: bytes, ttl: Optional[float] = None) -> None:
+        size = len(key) + len(data)
+        if size > self.max_bytes:
+            self.delete(key)
+            return
+        self.delete(key)
+        ttl = min(ttl, self.ttl) if ttl else self.ttl
+        self._entries[key] = (time.monotonic() + ttl, data)
+        self.size_bytes += size
+        while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+            old_key, (_, old_data) = self._entries.popitem(last=False)
+            self.size_bytes -= len(old_key) + len(old_data)
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(key) + len(entry[1])
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
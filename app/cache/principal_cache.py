@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import logging
+import time
+from ..core.config import settings
+from ..core.redis_client import redis_client
+from ..schemas.user import UserPrincipal
+from .invalidation import ALL_KEYS, InvalidationBus, invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+# Two-tier cache of authenticated users keyed on the token subject: an
+# in-process LRU in front of Redis. Entries never outlive the token that
+# populated them.
+class PrincipalCache:
+    def __init__(self, max_size: int, local_ttl: int, ttl: int, bus: Optional[InvalidationBus] = None):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self.bus = bus
+        self._local: "OrderedDict[str, Tuple[float, UserPrincipal]]" = OrderedDict()
+        if bus is not None:
+            bus.add_handler(self._drop_local)
+
+    def _drop_local(self, key: str) -> None:
+        if key == ALL_KEYS:
+            self._local.clear()
+        elif key.startswith("principal:"):
+            self._local.pop(key[len("principal:"):], None)
+
+    @staticmethod
+    def _key(subject: str) -> str:
+        return f"principal:{subject}"
+
+    def _get_local(self, subject: str) -> Optional[UserPrincipal]:
+        entry = self._local.get(subject)
+        if entry is None:
+            return None
+        deadline, principal = entry
+        if deadline <= time.monotonic():
+            self._local.pop(subject, None)
+            return None
+        self._local.move_to_end(subject)
+        return principal
+
+    def _set_local(self, subject: str, principal: UserPrincipal, ttl: float) -> None:
+        self._local[subject] = (time.monotonic() + min(ttl, self.local_ttl), principal)
+        self._local.move_to_end(subject)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    def _remaining(self, expires_at: Optional[float]) -> float:
+        if expires_at is None:
+            return self.ttl
+        return min(self.ttl, expires_at - time.time())
+
+    async def get(self, subject: str, expires_at: Optional[float] = None) -> Optional[UserPrincipal]:
+        principal = self._get_local(subject)
+        if principal is not None:
+            return principal
+
+        try:
+            data = await redis_client.get(self._key(subject))
+        except Exception as e:
+            logger.error(f"Principal cache get error: {e}")
+            return None
+        if not data:
+            return None
+
+        principal = UserPrincipal.model_validate_json(data)
+        ttl = self._remaining(expires_at)
+        if ttl > 0:
+            self._set_local(subject, principal, ttl)
+        return principal
+
+    async def set(self, subject: str, principal: UserPrincipal, expires_at: Optional[float] = None) -> None:
+        ttl = self._remaining(expires_at)
+        if ttl <= 0:
+            return
+        self._set_local(subject, principal, ttl)
+        try:
+            await redis_client.set(self._key(subject), principal.model_dump_json(), ex=max(1, int(ttl)))
+        except Exception as e:
+            logger.error(f"Principal cache set error: {e}")
+
+    async def invalidate(self, subject: str) -> None:
+        # Call whenever role, is_active or the password changes
+        self._local.pop(subject, None)
+        try:
+            await redis_client.delete(self._key(subject))
+        except Exception as e:
+            logger.error(f"Principal cache invalidate error: {e}")
+        if self.bus is not None:
+            await self.bus.publish(self._key(subject))
+
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    local_ttl=settings.PRINCIPAL_CACHE_LOCAL_TTL,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+    bus=invalidation_bus
+)
@@ -1,63 +1,437 @@
-from redis import Redis
+from redis.asyncio import Redis
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
 from ..core.config import settings
-import json
-from typing import Any, Optional
+from ..core.redis_client import redis_client
+from ..monitoring.prometheus import CACHE_REQUESTS
+from .invalidation import ALL_KEYS, InvalidationBus, invalidation_bus
+from .local_cache import LocalCache
+from .serializers import get_serializer
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from contextlib import AsyncExitStack
 from functools import wraps
+from enum import Enum
+import asyncio
+import hashlib
 import logging
+import math
+import random
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
 class RedisCache:
-    def __init__(self):
-        self.redis_client = Redis.from_url(settings.REDIS_URL, decode_responses=True)
-        self.default_ttl = 300  # 5 minutes
+    # Optional in-process L1 in front of Redis (L2). Every write publishes the
+    # touched keys on the invalidation bus so other pods drop their L1 copy.
+    def __init__(
+        self,
+        redis: Redis,
+        serializer=None,
+        default_ttl: int = 300,
+        local: Optional[LocalCache] = None,
+        bus: Optional[InvalidationBus] = None
+    ):
+        self.redis_client = redis
+        self.serializer = serializer or get_serializer("json")
+        self.default_ttl = default_ttl
+        self.local = local
+        self.bus = bus
+        if local is not None and bus is not None:
+            bus.add_handler(self._drop_local)
+
+    def _drop_local(self, key: str) -> None:
+        if key == ALL_KEYS:
+            self.local.clear()
+        else:
+            self.local.delete(key)
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        if self.local is None:
+            return None
+        data = self.local.get(key)
+        CACHE_REQUESTS.labels(tier="l1", result="hit" if data is not None else "miss").inc()
+        return data
+
+    def _set_local(self, key: str, data: bytes, ttl: Optional[int] = None) -> None:
+        if self.local is not None:
+            self.local.set(key, data, ttl)
+
+    def _delete_local(self, *keys: str) -> None:
+        if self.local is not None:
+            for key in keys:
+                self.local.delete(key)
+
+    def _publish(self, pipe, *keys: str) -> None:
+        if self.bus is not None and keys:
+            pipe.publish(self.bus.channel, self.bus.message(*keys))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "l1_entries": len(self.local) if self.local is not None else 0,
+            "l1_bytes": self.local.size_bytes if self.local is not None else 0,
+        }
+
+    async def _fetch(self, keys: List[str]) -> List[Optional[bytes]]:
+        # L1 first, then a single MGET for whatever is left
+        values = [self._get_local(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+        fetched = await self.redis_client.mget([keys[i] for i in missing])
+        for i, data in zip(missing, fetched):
+            CACHE_REQUESTS.labels(tier="l2", result="hit" if data is not None else "miss").inc()
+            if data is not None:
+                values[i] = data
+                self._set_local(keys[i], data)
+        return values
 
     async def set(self, key: str, value: Any, ttl: int = None) -> bool:
         try:
-            return self.redis_client.setex(
-                key,
-                ttl or self.default_ttl,
-                json.dumps(value)
-            )
+            data = self.serializer.dumps(value)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.set(key, data, ex=ttl or self.default_ttl)
+                self._publish(pipe, key)
+                results = await pipe.execute()
+            self._set_local(key, data, ttl or self.default_ttl)
+            return bool(results[0])
         except Exception as e:
             logger.error(f"Redis set error: {e}")
+            self._delete_local(key)
             return False
 
     async def get(self, key: str) -> Optional[Any]:
         try:
-            data = self.redis_client.get(key)
-            return json.loads(data) if data else None
+            data = (await self._fetch([key]))[0]
+            return self.serializer.loads(data) if data is not None else None
         except Exception as e:
             logger.error(f"Redis get error: {e}")
             return None
 
     async def delete(self, key: str) -> bool:
+        self._delete_local(key)
         try:
-            return bool(self.redis_client.delete(key))
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.delete(key)
+                self._publish(pipe, key)
+                results = await pipe.execute()
+            return bool(results[0])
         except Exception as e:
             logger.error(f"Redis delete error: {e}")
             return False
 
-cache = RedisCache()
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        # One MGET regardless of batch size; missing keys are omitted
+        keys: List[str] = list(keys)
+        if not keys:
+            return {}
+        try:
+            values = await self._fetch(keys)
+        except Exception as e:
+            logger.error(f"Redis mget error: {e}")
+            return {}
+        return {
+            key: self.serializer.loads(data)
+            for key, data in zip(keys, values)
+            if data is not None
+        }
+
+    async def set_many(self, mapping: Mapping[str, Any], ttl: int = None) -> bool:
+        if not mapping:
+            return True
+        ttl = ttl or self.default_ttl
+        encoded = {key: self.serializer.dumps(value) for key, value in mapping.items()}
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, data in encoded.items():
+                    pipe.set(key, data, ex=ttl)
+                self._publish(pipe, *encoded)
+                results = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Redis set_many error: {e}")
+            self._delete_local(*encoded)
+            return False
+        for key, data in encoded.items():
+            self._set_local(key, data, ttl)
+        return all(results[:len(encoded)])
+
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        keys = list(keys)
+        if not keys:
+            return 0
+        self._delete_local(*keys)
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.delete(*keys)
+                self._publish(pipe, *keys)
+                results = await pipe.execute()
+            return results[0]
+        except Exception as e:
+            logger.error(f"Redis delete_many error: {e}")
+            return 0
+
+    # Tags are version counters. Entries remember the versions they were
+    # computed under, so bumping a tag invalidates every dependent key at once
+    # without tracking or deleting them.
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"tag:{tag}"
+
+    async def get_tagged(self, key: str, tags: List[str]) -> Tuple[Optional[Any], Dict[str, int]]:
+        # The entry and its current tag versions in one MGET (or none at all
+        # when everything is in L1)
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        try:
+            values = await self._fetch([key] + tag_keys)
+        except Exception as e:
+            logger.error(f"Redis mget error: {e}")
+            return None, {}
+        versions = {tag: int(version or 0) for tag, version in zip(tags, values[1:])}
+        for tag_key, version in zip(tag_keys, values[1:]):
+            if version is None:
+                # Remember unset tags too, the bus drops them once bumped
+                self._set_local(tag_key, b"0")
+        if values[0] is None:
+            return None, versions
+        try:
+            entry = self.serializer.loads(values[0])
+        except Exception as e:
+            logger.error(f"Redis decode error: {e}")
+            return None, versions
+        if entry.get("tags", {}) != versions:
+            return None, versions
+        return entry, versions
+
+    async def invalidate_tags(self, *tags: str) -> bool:
+        if not tags:
+            return True
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        self._delete_local(*tag_keys)
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for tag_key in tag_keys:
+                    pipe.incr(tag_key)
+                self._publish(pipe, *tag_keys)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Redis tag invalidation error: {e}")
+            return False
+
+cache = RedisCache(
+    redis_client,
+    serializer=get_serializer(settings.CACHE_SERIALIZER),
+    default_ttl=settings.CACHE_DEFAULT_TTL,
+    local=LocalCache(
+        max_entries=settings.CACHE_LOCAL_MAX_ENTRIES,
+        max_bytes=settings.CACHE_LOCAL_MAX_BYTES,
+        ttl=settings.CACHE_LOCAL_TTL
+    ),
+    bus=invalidation_bus
+)
+
+# Only plain values take part in default keys; sessions, requests and ORM
+# objects have per-call reprs that would make every key unique.
+_KEYABLE_TYPES = (str, int, float, bool, type(None), Enum)
+
+def default_key_builder(*args, **kwargs) -> str:
+    parts = [repr(arg) for arg in args if isinstance(arg, _KEYABLE_TYPES)]
+    parts += [
+        f"{name}={value!r}"
+        for name, value in sorted(kwargs.items())
+        if isinstance(value, _KEYABLE_TYPES)
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+def key_by_user(*args, current_user, **kwargs) -> str:
+    return f"user:{current_user.id}"
+
+def user_tag(user_id: int, resource: str) -> str:
+    return f"user:{user_id}:{resource}"
+
+def tags_by_user(*resources: str) -> Callable[..., List[str]]:
+    def build(*args, current_user, **kwargs) -> List[str]:
+        return [user_tag(current_user.id, resource) for resource in resources]
+    return build
+
+def _should_refresh_early(entry: dict, beta: float, now: float) -> bool:
+    # XFetch: the closer to expiry and the slower the computation, the more
+    # likely a caller refreshes before the entry actually expires
+    if beta <= 0:
+        return False
+    return now - entry["delta"] * beta * math.log(random.random() or 1e-12) >= entry["expires"]
+
+_inflight: Dict[str, asyncio.Future] = {}
+_refreshing: Set[asyncio.Task] = set()
+
+# Deletes the lock only while it still holds our token, so a caller whose
+# lock expired can't release the one another pod acquired since
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def cached(
+    ttl: int = None,
+    key_builder: Callable[..., str] = None,
+    response_model: Any = None,
+    stale_ttl: int = None,
+    beta: float = None,
+    tags: Callable[..., List[str]] = None
+):
+    ttl = ttl or cache.default_ttl
+    stale_ttl = settings.CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+    beta = settings.CACHE_EARLY_REFRESH_BETA if beta is None else beta
+    key_builder = key_builder or default_key_builder
+    adapter = TypeAdapter(response_model) if response_model is not None else None
+
+    def encode(value: Any) -> Any:
+        if adapter is not None:
+            return adapter.dump_python(
+                adapter.validate_python(value, from_attributes=True), mode="json"
+            )
+        return jsonable_encoder(value)
+
+    def decode(value: Any) -> Any:
+        return adapter.validate_python(value) if adapter is not None else value
 
-def cached(ttl: int = None):
     def decorator(func):
+        prefix = f"cache:{func.__module__}.{func.__qualname__}"
+
+        async def compute(key: str, versions: Dict[str, int], args, kwargs) -> Any:
+            # versions were read before computing, so a tag bumped meanwhile
+            # leaves this entry already invalid
+            started = time.monotonic()
+            result = await func(*args, **kwargs)
+            value = encode(result)
+            delta = time.monotonic() - started
+            await cache.set(
+                key,
+                {"value": value, "delta": delta, "expires": time.time() + ttl, "tags": versions},
+                ttl + stale_ttl
+            )
+            return value
+
+        async def compute_once(key: str, entry_tags: List[str], versions: Dict[str, int], args, kwargs) -> Any:
+            # Single-flight: concurrent callers on this pod share one computation,
+            # and a short Redis lock keeps other pods from recomputing as well
+            while key in _inflight:
+                future = _inflight[key]
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # Only the leader was cancelled: take over or follow the next one
+                    if not future.cancelled():
+                        raise
+
+            future = asyncio.get_running_loop().create_future()
+            _inflight[key] = future
+            try:
+                lock_key = f"lock:{key}"
+                token = await _acquire_lock(lock_key)
+                if token is None:
+                    entry = await _wait_for_entry(key, entry_tags)
+                    if entry is not None:
+                        future.set_result(entry["value"])
+                        return entry["value"]
+                try:
+                    value = await compute(key, versions, args, kwargs)
+                finally:
+                    if token is not None:
+                        await _release_lock(lock_key, token)
+                future.set_result(value)
+                return value
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                # Mark retrieved so an unawaited failure isn't logged
+                future.exception()
+                raise
+            finally:
+                if _inflight.get(key) is future:
+                    del _inflight[key]
+
+        async def refresh(key: str, entry_tags: List[str], versions: Dict[str, int], args, kwargs) -> None:
+            # Runs after the caller was answered from the stale entry, when its
+            # request-scoped session may already be closed: sessions are swapped
+            # for fresh ones owned by the refresh
+            from ..database import AsyncSessionLocal
+            try:
+                async with AsyncExitStack() as stack:
+                    async def own(value: Any) -> Any:
+                        if isinstance(value, AsyncSession):
+                            return await stack.enter_async_context(AsyncSessionLocal())
+                        return value
+
+                    args = [await own(arg) for arg in args]
+                    kwargs = {name: await own(value) for name, value in kwargs.items()}
+                    await compute_once(key, entry_tags, versions, args, kwargs)
+            except Exception as e:
+                logger.error(f"Background cache refresh error for {key}: {e}")
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Create cache key from function name and arguments
-            key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-            
-            # Try to get from cache
-            cached_value = await cache.get(key)
-            if cached_value is not None:
-                return cached_value
-            
-            # If not in cache, execute function
-            result = await func(*args, **kwargs)
-            
-            # Store in cache
-            await cache.set(key, result, ttl)
-            
-            return result
+            key = f"{prefix}:{key_builder(*args, **kwargs)}"
+            entry_tags = tags(*args, **kwargs) if tags is not None else []
+            entry, versions = await cache.get_tagged(key, entry_tags)
+            if entry is None:
+                return decode(await compute_once(key, entry_tags, versions, args, kwargs))
+
+            now = time.time()
+            fresh = now < entry["expires"]
+            if fresh and not _should_refresh_early(entry, beta, now):
+                return decode(entry["value"])
+
+            # Stale (or picked for early refresh): every caller is served the
+            # current value while one background task per key recomputes it
+            if key not in _inflight and not await _is_locked(f"lock:{key}"):
+                task = asyncio.create_task(refresh(key, entry_tags, versions, args, kwargs))
+                _refreshing.add(task)
+                task.add_done_callback(_refreshing.discard)
+            return decode(entry["value"])
         return wrapper
     return decorator
+
+async def _acquire_lock(lock_key: str) -> Optional[str]:
+    # Returns this caller's token, or None when someone else holds the lock
+    token = uuid.uuid4().hex
+    try:
+        acquired = await cache.redis_client.set(
+            lock_key, token, nx=True, px=int(settings.CACHE_LOCK_TIMEOUT * 1000)
+        )
+    except Exception as e:
+        logger.error(f"Redis lock error: {e}")
+        return token
+    return token if acquired else None
+
+async def _release_lock(lock_key: str, token: str) -> None:
+    # Straight to Redis: going through cache.delete would also publish an L1
+    # invalidation for a key that is never cached
+    try:
+        await cache.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+    except Exception as e:
+        logger.error(f"Redis lock release error: {e}")
+
+async def _is_locked(lock_key: str) -> bool:
+    try:
+        return bool(await cache.redis_client.exists(lock_key))
+    except Exception as e:
+        logger.error(f"Redis lock check error: {e}")
+        return False
+
+async def _wait_for_entry(key: str, tags: List[str]) -> Optional[dict]:
+    # Another pod holds the lock; poll briefly for its result before giving up
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        entry, _ = await cache.get_tagged(key, tags)
+        if entry is not None and entry["expires"] > time.time():
+            return entry
+        if not await _is_locked(f"lock:{key}"):
+            break
+    return None
@@ -0,0 +1,49 @@
+from typing import Any
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+class JsonSerializer:
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(value)
+        return json.dumps(value, default=str).encode()
+
+    def loads(self, data: bytes) -> Any:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+class MsgpackSerializer:
+    name = "msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed; pip install msgpack")
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+}
+
+def get_serializer(name: str):
+    try:
+        return SERIALIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown cache serializer: {name}")
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import EmailStr, validator
 import secrets
 
@@ -12,6 +12,9 @@ class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    BCRYPT_ROUNDS: int = 12  # existing hashes are upgraded on next login
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 32  # pending hashes before shedding with 503
     
     # Database
     DATABASE_URL: str
@@ -27,21 +30,97 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: Optional[str] = None
     EMAILS_FROM_EMAIL: Optional[EmailStr] = None
     EMAILS_FROM_NAME: Optional[str] = None
+    SMTP_TIMEOUT: int = 10
+    SMTP_POOL_SIZE: int = 2  # persistent connections per process
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100  # recycled afterwards
+    EMAIL_DELIVERY: str = "celery"  # "celery" or "inline" (sent from the API process)
+    EMAIL_BATCH_SIZE: int = 50  # messages per send_email_batch task
+    EMAIL_BATCH_WINDOW: float = 0.5  # seconds the API gathers emails before enqueuing a batch
+    EMAIL_MAX_RETRIES: int = 5
+    SERVER_HOST: str = "http://localhost:8001"  # base URL used in email links
+    
+    # File storage: "s3", "local" or "memory"
+    STORAGE_BACKEND: str = "s3"
+    LOCAL_STORAGE_ROOT: str = "static/uploads"
+    LOCAL_STORAGE_URL_PREFIX: str = "/static/uploads"
     
     # AWS S3 Config
     AWS_ACCESS_KEY_ID: Optional[str] = None
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_BUCKET_NAME: Optional[str] = None
+    S3_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024  # S3 requires >= 5MB per part
+    S3_MULTIPART_CONCURRENCY: int = 4
+    PRESIGNED_URL_EXPIRE_SECONDS: int = 900
     
     # Redis Config
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: int = 5  # seconds to wait for a free connection
+    
+    # Response cache
+    CACHE_DEFAULT_TTL: int = 300
+    CACHE_SERIALIZER: str = "json"  # "json" (orjson when installed) or "msgpack"
+    CACHE_STALE_TTL: int = 60  # how long expired entries may still be served while refreshing
+    CACHE_EARLY_REFRESH_BETA: float = 1.0  # 0 disables probabilistic early refresh
+    CACHE_LOCK_TIMEOUT: float = 5.0  # seconds
+    CACHE_LOCAL_MAX_ENTRIES: int = 10_000  # in-process L1 tier
+    CACHE_LOCAL_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_LOCAL_TTL: int = 30
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"
+    
+    # WebSockets
+    WS_CHANNEL_PREFIX: str = "ws"  # Redis pub/sub channels shared by all pods
+    WS_SEND_QUEUE_SIZE: int = 256  # outbound messages buffered per connection
+    WS_SLOW_CONSUMER_POLICY: str = "drop_oldest"  # "drop_oldest", "drop_newest" or "disconnect"
+    WS_MAX_CONNECTIONS: int = 20_000  # per process; further sockets are refused with 1013
+    WS_PING_INTERVAL: float = 25  # seconds between protocol-level pings sent by uvicorn
+    WS_PING_TIMEOUT: float = 50  # seconds to wait for the pong before the socket is closed
+    WS_PER_MESSAGE_DEFLATE: bool = True
+    WS_COALESCE_WINDOW: float = 0.005  # seconds to gather messages into one frame (batch subprotocols)
+    WS_COALESCE_MAX_MESSAGES: int = 64
+    
+    # Authenticated user cache
+    PRINCIPAL_CACHE_TTL: int = 300  # Redis tier, seconds
+    PRINCIPAL_CACHE_LOCAL_TTL: int = 30  # in-process tier, seconds
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10_000
+    
+    # Metrics (PROMETHEUS_MULTIPROC_DIR, set in the Dockerfile, aggregates gunicorn workers)
+    METRICS_MAX_ENDPOINTS: int = 500  # distinct endpoint label values before folding into "<other>"
+    METRICS_LATENCY_BUCKETS: List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    
+    # Access Log
+    ACCESS_LOG_SAMPLE_RATE: float = 1.0  # share of 2xx/3xx requests logged; errors and slow requests always are
+    ACCESS_LOG_SLOW_REQUEST_SECONDS: float = 1.0
+    ACCESS_LOG_QUEUE_SIZE: int = 10_000  # records buffered for the writer thread before new ones are dropped
+    REQUEST_ID_HEADER: str = "X-Request-ID"
+    
+    # Tracing (needs opentelemetry-sdk, plus opentelemetry-exporter-otlp for a collector)
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "otlp"  # otlp (local collector), console, or memory (tests)
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4317"
+    TRACING_SAMPLE_RATIO: float = 0.1  # share of new traces recorded; child spans follow their parent
     
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 10_000  # in-process token buckets kept per pod
+    # Header carrying the client address, overwritten by our proxy (X-Real-IP
+    # in k8s/nginx-config.yaml). Set to "" when the API is reachable directly.
+    CLIENT_IP_HEADER: str = "X-Real-IP"
     
     # File Upload
     MAX_UPLOAD_SIZE: int = 5_242_880  # 5MB
     ALLOWED_FILE_TYPES: List[str] = ["image/jpeg", "image/png", "application/pdf"]
+    FILE_BULK_MAX_ITEMS: int = 1000  # ids accepted by the bulk endpoints
+    
+    # Image Processing
+    IMAGE_VARIANT_SIZES: Dict[str, int] = {"thumbnail": 256, "medium": 1024}  # longest edge, px
+    IMAGE_VARIANT_FORMATS: List[str] = ["webp", "jpeg"]
+    IMAGE_WEBP_QUALITY: int = 80
+    IMAGE_JPEG_QUALITY: int = 82
+    IMAGE_MAX_PIXELS: int = 40_000_000  # decompression bomb guard
+    IMAGE_PROCESS_WORKERS: int = 2  # processes rendering variants in each worker
+    IMAGE_BATCH_SIZE: int = 50  # uploads per process_uploaded_files task
+    IMAGE_BATCH_WINDOW: float = 0.5  # seconds the API gathers uploads before enqueuing a batch
     
     class Config:
         case_sensitive = True
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from typing import NamedTuple
+import itertools
+import logging
+import math
+import os
+import time
+from redis.asyncio import Redis
+from .config import settings
+from .redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Sliding-window log kept in a sorted set. Trimming, counting and recording
+# the hit happen atomically on the server in a single round-trip. Redis' own
+# clock is used so pods with skewed clocks agree on the window.
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local member = ARGV[3]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, window)
+    return {1, limit - count - 1, window}
+end
+
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+local retry_after = window - (now - tonumber(oldest[2]))
+return {0, 0, retry_after}
+"""
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # seconds until the window frees a slot
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: int, rate: float):
+        self.capacity = capacity
+        self.rate = rate  # tokens per second
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def consume(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refund(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def time_until_token(self) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+class RateLimiter:
+    # A pod can never legitimately serve more than the global limit, so a
+    # local bucket (same limit, same period) sheds floods without a Redis
+    # round-trip. Tokens are refunded when Redis rejects, so the bucket only
+    # counts requests that were actually served; it is an approximation of
+    # the sliding window, not an exact subset of what Redis would reject.
+    def __init__(self, redis: Redis, local_max_keys: int = 10_000):
+        self.redis = redis
+        self.local_max_keys = local_max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+        self._counter = itertools.count()
+        self._member_prefix = f"{os.getpid()}-{id(self)}"
+
+    def _local_bucket(self, key: str, calls: int, period: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(calls, calls / period)
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.local_max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    async def hit(self, key: str, calls: int, period: float) -> RateLimitResult:
+        bucket = self._local_bucket(key, calls, period)
+        if not bucket.consume():
+            return RateLimitResult(False, calls, 0, bucket.time_until_token())
+
+        member = f"{self._member_prefix}-{next(self._counter)}"
+        try:
+            allowed, remaining, reset_ms = await self._script(
+                keys=[key],
+                args=[int(period * 1000), calls, member]
+            )
+        except Exception as e:
+            # Fail open: the local bucket still caps each pod
+            logger.error(f"Rate limiter error: {e}")
+            return RateLimitResult(True, calls, int(bucket.tokens), period)
+
+        if not allowed:
+            bucket.refund()
+        return RateLimitResult(bool(allowed), calls, int(remaining), int(reset_ms) / 1000)
+
+def rate_limit_headers(result: RateLimitResult) -> dict:
+    headers = {
+        "X-RateLimit-Limit": str(result.limit),
+        "X-RateLimit-Remaining": str(result.remaining),
+        "X-RateLimit-Reset": str(math.ceil(result.reset_after)),
+    }
+    if not result.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(result.reset_after)))
+    return headers
+
+rate_limiter = RateLimiter(redis_client, local_max_keys=settings.RATE_LIMIT_LOCAL_MAX_KEYS)
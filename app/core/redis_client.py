@@ -0,0 +1,13 @@
+from redis.asyncio import BlockingConnectionPool, Redis
+from .config import settings
+from ..monitoring.tracing import instrument_redis
+
+# Shared, bounded pool for all async Redis users in the process
+redis_pool = BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT
+)
+
+redis_client = Redis(connection_pool=redis_pool)
+instrument_redis(redis_client)
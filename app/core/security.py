@@ -1,12 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
+from functools import partial
+from typing import Any, Callable, Optional, Tuple, TypeVar, Union
+import asyncio
+import threading
 from jose import jwt
 from passlib.context import CryptContext
 from ..core.config import settings
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException, status
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
 def create_access_token(subject: Union[str, Any]) -> str:
@@ -31,3 +39,48 @@ def get_password_hash(password: str) -> str:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event
+# loop. Requests beyond the queue limit are shed instead of piling up.
+T = TypeVar("T")
+
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+_pending_hashes = 0
+_pending_lock = threading.Lock()
+
+def _hash_finished(future) -> None:
+    # Runs when the pool job itself ends, so a cancelled awaiter doesn't free
+    # a slot while bcrypt is still busy with its password
+    global _pending_hashes
+    with _pending_lock:
+        _pending_hashes -= 1
+
+async def _run_in_hash_pool(func: Callable[..., T], *args: Any) -> T:
+    global _pending_hashes
+    with _pending_lock:
+        if _pending_hashes >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        _pending_hashes += 1
+    try:
+        future = _hash_executor.submit(partial(func, *args))
+    except BaseException:
+        _hash_finished(None)
+        raise
+    future.add_done_callback(_hash_finished)
+    return await asyncio.wrap_future(future)
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_hash_pool(pwd_context.hash, password)
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    # Returns a new hash when the stored one uses an outdated cost factor
+    return await _run_in_hash_pool(pwd_context.verify_and_update, plain_password, hashed_password)
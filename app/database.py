@@ -1,14 +1,56 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from .models.user import Base
+from .monitoring.tracing import instrument_engine
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# libpq options asyncpg rejects in the DSN; sslmode is passed as ssl instead
+LIBPQ_ONLY_OPTIONS = ("sslmode", "channel_binding")
+
+def get_async_database_url(url: str) -> str:
+    # asyncpg needs its own driver prefix; the sync URL stays usable for alembic
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    elif url.startswith("postgresql+psycopg2://"):
+        url = url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    elif url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql+asyncpg://"):
+        parsed = make_url(url)
+        query = {key: value for key, value in parsed.query.items() if key not in LIBPQ_ONLY_OPTIONS}
+        return parsed.set(query=query).render_as_string(hide_password=False)
+    return url
+
+def get_async_engine_options(url: str) -> dict:
+    # Connection arguments and pool sizing differ per driver: aiosqlite takes
+    # neither a timeout nor ssl, and in-memory SQLite can't be pooled
+    parsed = make_url(get_async_database_url(url))
+    if parsed.get_backend_name() == "sqlite":
+        return {}
+    sslmode = make_url(url).query.get("sslmode", "require")  # Required for Neon
+    return {
+        "pool_pre_ping": True,
+        "pool_recycle": 60,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 20)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        "connect_args": {
+            "timeout": 10,
+            "ssl": sslmode
+        }
+    }
+
 # Configure engine for Neon PostgreSQL
 engine = create_engine(
-    os.getenv("DATABASE_URL"),
+    DATABASE_URL,
     echo=True,  # Set to False in production
     pool_pre_ping=True,
     pool_recycle=60,  # Reduced for cloud DB
@@ -22,6 +64,24 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the API so queries don't block the event loop
+async_engine = create_async_engine(
+    get_async_database_url(DATABASE_URL),
+    echo=False,
+    **get_async_engine_options(DATABASE_URL)
+)
+
+# Query spans for the API (async) and for Celery tasks (sync)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create tables
 try:
     Base.metadata.create_all(bind=engine)
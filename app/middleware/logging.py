@@ -1,19 +1,95 @@
-from fastapi import Request
-import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import json
 import logging
+import queue
+import random
+import re
+import sys
+import uuid
 from ..core.config import settings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def logging_middleware(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    
-    logger.info(
-        f"Method: {request.method} Path: {request.url.path} "
-        f"Status: {response.status_code} Duration: {process_time:.2f}s"
-    )
-    
-    return response
+# Id of the request being handled, for anything that wants to tag its own
+# logs or outgoing calls with it
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    # Upstream ids (load balancer, caller) are kept when they look sane so
+    # one id follows the request across services
+    if incoming and REQUEST_ID_PATTERN.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(getattr(record, "access", {}))
+        return json.dumps(payload, default=str)
+
+class DroppingQueueHandler(QueueHandler):
+    # The event loop must never wait on log I/O: when the writer thread falls
+    # behind, records are counted and dropped instead of blocking
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+access_queue: queue.Queue = queue.Queue(maxsize=settings.ACCESS_LOG_QUEUE_SIZE)
+access_handler = logging.StreamHandler(sys.stdout)
+access_handler.setFormatter(JsonFormatter())
+access_listener = QueueListener(access_queue, access_handler)
+
+access_logger = logging.getLogger("app.access")
+access_logger.setLevel(logging.INFO)
+access_logger.propagate = False
+access_logger.addHandler(DroppingQueueHandler(access_queue))
+
+def start_access_log() -> None:
+    # JSON formatting and the write itself happen on the listener's thread
+    if access_listener._thread is None:
+        access_listener.start()
+
+def stop_access_log() -> None:
+    # Flushes whatever is still queued
+    if access_listener._thread is not None:
+        access_listener.stop()
+
+def should_log(status: int, duration: float) -> bool:
+    if status >= 400 or duration >= settings.ACCESS_LOG_SLOW_REQUEST_SECONDS:
+        return True
+    return random.random() < settings.ACCESS_LOG_SAMPLE_RATE
+
+def log_request(
+    method: str,
+    path: str,
+    status: int,
+    duration: float,
+    request_id: Optional[str] = None,
+    client: Optional[str] = None
+) -> None:
+    if not should_log(status, duration):
+        return
+    access_logger.info("request", extra={"access": {
+        "request_id": request_id,
+        "method": method,
+        "path": path,
+        "status": status,
+        "duration_ms": round(duration * 1000, 3),
+        "client": client,
+    }})
@@ -0,0 +1,58 @@
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import time
+from ..core.config import settings
+from ..monitoring.prometheus import observe_request
+from ..monitoring.tracing import finish_server_span, server_span
+from .logging import log_request, new_request_id, request_id_var
+
+class ObservabilityMiddleware:
+    # Timing, metrics, access logging and the X-API-Version header in one raw
+    # ASGI layer. Unlike @app.middleware("http") it never wraps the response
+    # in a task and memory stream, so streaming bodies pass straight through.
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.version_header = (b"x-api-version", settings.VERSION.encode("latin-1"))
+        self.request_id_header = settings.REQUEST_ID_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status = 500  # if the app raises before starting a response
+        request_id = new_request_id(Headers(scope=scope).get(settings.REQUEST_ID_HEADER))
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    self.version_header,
+                    (self.request_id_header, request_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        with server_span(scope) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # The router records the matched route in the shared scope, so
+                # the metrics label is the template even though we sit outside it
+                duration = time.perf_counter() - start_time
+                request_id_var.reset(token)
+                observe_request(scope, status, duration)
+                client = scope.get("client")
+                log_request(
+                    scope["method"],
+                    scope["path"],
+                    status,
+                    duration,
+                    request_id,
+                    client[0] if client else None
+                )
+                if span is not None:
+                    finish_server_span(span, scope, status, request_id)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from ..database import Base
+
+class Blob(Base):
+    # Content-addressed storage object shared by every File with the same bytes
+    __tablename__ = "blobs"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), unique=True, index=True, nullable=False)
+    storage_key = Column(String, nullable=False)
+    size = Column(Integer)  # in bytes
+    mime_type = Column(String)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    files = relationship("File", back_populates="blob")
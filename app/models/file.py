@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Index, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -6,6 +6,10 @@ from .enums import FileType
 
 class File(Base):
     __tablename__ = "files"
+    __table_args__ = (
+        # Serves per-user listings ordered by (created_at, id) for keyset pagination
+        Index("ix_files_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -14,7 +18,10 @@ class File(Base):
     file_url = Column(String)
     mime_type = Column(String)
     size = Column(Integer)  # in bytes
+    variants = Column(JSON(none_as_null=True), nullable=True)  # {"thumbnail.webp": url, ...}
+    blob_id = Column(Integer, ForeignKey("blobs.id"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="files")
+    blob = relationship("Blob", back_populates="files")
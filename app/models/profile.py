@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -11,6 +11,7 @@ class Profile(Base):
     full_name = Column(String)
     bio = Column(String, nullable=True)
     avatar_url = Column(String, nullable=True)
+    avatar_variants = Column(JSON(none_as_null=True), nullable=True)
     phone_number = Column(String, nullable=True)
     address = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
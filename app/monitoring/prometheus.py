@@ -1,6 +1,26 @@
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
-from fastapi import Request, Response
-import time
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+    CONTENT_TYPE_LATEST
+)
+from fastapi import Response
+from starlette.concurrency import run_in_threadpool
+from starlette.types import Scope
+from typing import Set
+import os
+from ..core.config import settings
+
+# Label used for requests that matched no route (404s, scanners)
+UNMATCHED_ENDPOINT = "<unmatched>"
+# Label used once METRICS_MAX_ENDPOINTS distinct endpoints have been seen
+OTHER_ENDPOINT = "<other>"
+
+KNOWN_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
 
 # Metrics
 REQUEST_COUNT = Counter(
@@ -12,28 +32,98 @@ REQUEST_COUNT = Counter(
 REQUEST_LATENCY = Histogram(
     "http_request_latency_seconds",
     "HTTP request latency",
-    ["method", "endpoint"]
+    ["method", "endpoint"],
+    buckets=settings.METRICS_LATENCY_BUCKETS
 )
 
-async def metrics_middleware(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by tier (l1 in-process, l2 Redis) and result",
+    ["tier", "result"]
+)
+
+WS_CONNECTIONS = Gauge(
+    "websocket_connections",
+    "WebSocket connections open on this process",
+    multiprocess_mode="livesum"
+)
+
+WS_QUEUED_MESSAGES = Gauge(
+    "websocket_queued_messages",
+    "Outbound WebSocket messages waiting in per-connection send queues",
+    multiprocess_mode="livesum"
+)
+
+WS_QUEUE_DEPTH = Histogram(
+    "websocket_send_queue_depth",
+    "Send queue depth observed when a message is enqueued",
+    buckets=(0, 1, 4, 16, 64, 256, 1024)
+)
+
+WS_DROPPED_MESSAGES = Counter(
+    "websocket_dropped_messages_total",
+    "Outbound WebSocket messages dropped for slow consumers, by policy",
+    ["policy"]
+)
+
+class LabelGuard:
+    # Caps the distinct values a label can take; anything past the limit is
+    # folded into one series so memory and scrape time stay bounded
+    def __init__(self, max_values: int, overflow: str = OTHER_ENDPOINT):
+        self.max_values = max_values
+        self.overflow = overflow
+        self._seen: Set[str] = set()
+
+    def label(self, value: str) -> str:
+        if value in self._seen:
+            return value
+        if len(self._seen) < self.max_values:
+            self._seen.add(value)
+            return value
+        return self.overflow
+
+endpoint_guard = LabelGuard(settings.METRICS_MAX_ENDPOINTS)
+
+def endpoint_label(scope: Scope) -> str:
+    # The matched route template (/files/{file_id}), never the raw path
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if template is None:
+        return UNMATCHED_ENDPOINT
+    return endpoint_guard.label(template)
+
+def method_label(method: str) -> str:
+    return method if method in KNOWN_METHODS else "OTHER"
+
+def observe_request(scope: Scope, status: int, duration: float) -> None:
+    # Called once the response is sent, after routing has filled in the route
+    method = method_label(scope["method"])
+    endpoint = endpoint_label(scope)
     REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=request.url.path,
-        status=response.status_code
+        method=method,
+        endpoint=endpoint,
+        status=status
     ).inc()
     
     REQUEST_LATENCY.labels(
-        method=request.method,
-        endpoint=request.url.path
-    ).observe(time.time() - start_time)
-    
-    return response
+        method=method,
+        endpoint=endpoint
+    ).observe(duration)
+
+def get_registry() -> CollectorRegistry:
+    # Under gunicorn (gunicorn.conf.py) each worker writes its samples to
+    # PROMETHEUS_MULTIPROC_DIR; a scrape of any worker aggregates them all
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
 
 async def metrics():
+    # Serializing (and in multiprocess mode reading the per-worker files)
+    # is blocking work, so it stays off the event loop
+    output = await run_in_threadpool(generate_latest, get_registry())
     return Response(
-        generate_latest(),
+        output,
         media_type=CONTENT_TYPE_LATEST
     )
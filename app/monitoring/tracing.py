@@ -0,0 +1,254 @@
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional
+import inspect
+import logging
+from ..core.config import settings
+
+# OpenTelemetry is optional. Without opentelemetry-api, or with
+# TRACING_ENABLED off, every instrument_* call is a no-op and nothing on the
+# request path changes.
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:  # pragma: no cover
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+# Finished spans when TRACING_EXPORTER is "memory" (tests)
+memory_exporter = None
+
+def tracing_enabled() -> bool:
+    return settings.TRACING_ENABLED and trace is not None
+
+def get_tracer():
+    return trace.get_tracer("app")
+
+def setup_tracing(service_name: str = None):
+    # Installs the SDK provider. Spans started before this (e.g. at import)
+    # go through the API's proxy tracer and pick the provider up afterwards.
+    # Call it after forking, since the batch processor owns a thread.
+    global memory_exporter
+    if not tracing_enabled():
+        return None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        logger.error("TRACING_ENABLED is set but opentelemetry-sdk is not installed")
+        return None
+
+    # Head sampling: a ratio of new traces is recorded and children follow
+    # their parent's decision, so unsampled requests cost almost nothing
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name or settings.PROJECT_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO))
+    )
+    if settings.TRACING_EXPORTER == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        memory_exporter = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(memory_exporter))
+    elif settings.TRACING_EXPORTER == "console":
+        provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+    else:
+        # A local collector (otel-collector, Jaeger, Tempo) speaking OTLP/gRPC
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        provider.add_span_processor(BatchSpanProcessor(
+            OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT, insecure=True)
+        ))
+    trace.set_tracer_provider(provider)
+    return provider
+
+def _fail(span, error: BaseException) -> None:
+    span.record_exception(error)
+    span.set_status(Status(StatusCode.ERROR, str(error)))
+
+# HTTP
+
+def server_span(scope):
+    # Context manager yielding the request's span, or None when tracing is off
+    if not tracing_enabled():
+        return nullcontext()
+    return _server_span(scope)
+
+@contextmanager
+def _server_span(scope) -> Iterator:
+    carrier = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+    with get_tracer().start_as_current_span(
+        scope["method"],
+        context=propagate.extract(carrier),
+        kind=SpanKind.SERVER,
+        attributes={"http.method": scope["method"], "http.target": scope["path"]}
+    ) as span:
+        yield span
+
+def finish_server_span(span, scope, status: int, request_id: Optional[str] = None) -> None:
+    # Named after the route template once routing has run, like the metrics
+    route = getattr(scope.get("route"), "path_format", None)
+    if route:
+        span.update_name(f"{scope['method']} {route}")
+        span.set_attribute("http.route", route)
+    span.set_attribute("http.status_code", status)
+    if request_id:
+        span.set_attribute("http.request_id", request_id)
+    if status >= 500:
+        span.set_status(Status(StatusCode.ERROR))
+
+# SQLAlchemy
+
+def instrument_engine(engine) -> None:
+    # Takes a sync Engine; for an AsyncEngine pass engine.sync_engine. The
+    # async driver runs these hooks in a greenlet sharing the caller's
+    # context, so query spans nest under the request span.
+    if not tracing_enabled():
+        return
+    from sqlalchemy import event
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._trace_span = get_tracer().start_span(
+            statement.split(None, 1)[0].upper() if statement else "query",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": system, "db.statement": statement[:2048]}
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        span = getattr(exception_context.execution_context, "_trace_span", None)
+        if span is not None:
+            _fail(span, exception_context.original_exception)
+            span.end()
+
+# Redis
+
+def _traced_call(call, describe):
+    # Wraps a sync or async callable in a client span; describe() maps the
+    # call's arguments to the span name and attributes
+    if inspect.iscoroutinefunction(call):
+        async def traced(*args, **kwargs):
+            name, attributes = describe(*args)
+            with get_tracer().start_as_current_span(name, kind=SpanKind.CLIENT, attributes=attributes):
+                return await call(*args, **kwargs)
+    else:
+        def traced(*args, **kwargs):
+            name, attributes = describe(*args)
+            with get_tracer().start_as_current_span(name, kind=SpanKind.CLIENT, attributes=attributes):
+                return call(*args, **kwargs)
+    return traced
+
+def instrument_redis(client) -> None:
+    # Wraps one redis client, sync or asyncio: a span per command, and one per
+    # pipeline flush rather than per queued command
+    if not tracing_enabled():
+        return
+    pipeline = client.pipeline
+
+    def describe_command(*args):
+        command = str(args[0]).upper()
+        return command, {"db.system": "redis", "db.operation": command}
+
+    def traced_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        pipe.execute = _traced_call(pipe.execute, lambda *execute_args: (
+            "PIPELINE", {"db.system": "redis", "db.redis.commands": len(pipe.command_stack)}
+        ))
+        return pipe
+
+    client.execute_command = _traced_call(client.execute_command, describe_command)
+    client.pipeline = traced_pipeline
+
+# boto3
+
+def instrument_boto_client(client) -> None:
+    # botocore's own call events bracket each API request. The threadpool
+    # copies the caller's context, so the spans join the request's trace.
+    if not tracing_enabled():
+        return
+    service = client.meta.service_model.service_id.hyphenize()
+
+    def before_parameter_build(params, context, **kwargs):
+        # Only this event sees the caller's parameters
+        if params.get("Bucket"):
+            context["trace_bucket"] = params["Bucket"]
+
+    def before_call(model, context, **kwargs):
+        attributes = {"rpc.system": "aws-api", "rpc.service": service, "rpc.method": model.name}
+        if "trace_bucket" in context:
+            attributes["aws.s3.bucket"] = context["trace_bucket"]
+        context["trace_span"] = get_tracer().start_span(
+            f"{service}.{model.name}", kind=SpanKind.CLIENT, attributes=attributes
+        )
+
+    def after_call(http_response, context, **kwargs):
+        span = context.pop("trace_span", None)
+        if span is not None:
+            span.set_attribute("http.status_code", http_response.status_code)
+            span.end()
+
+    def after_call_error(exception, context, **kwargs):
+        span = context.pop("trace_span", None)
+        if span is not None:
+            _fail(span, exception)
+            span.end()
+
+    client.meta.events.register(f"before-parameter-build.{service}", before_parameter_build)
+    client.meta.events.register(f"before-call.{service}", before_call)
+    client.meta.events.register(f"after-call.{service}", after_call)
+    client.meta.events.register(f"after-call-error.{service}", after_call_error)
+
+# Celery
+
+_task_spans: Dict[str, tuple] = {}
+
+def instrument_celery() -> None:
+    # The publisher writes its trace context into the message headers; the
+    # worker continues that trace around the task body
+    if not tracing_enabled():
+        return
+    from celery import signals
+
+    @signals.before_task_publish.connect(weak=False)
+    def _inject_context(headers=None, **kwargs):
+        if headers is not None:
+            propagate.inject(headers)
+
+    @signals.task_prerun.connect(weak=False)
+    def _start_task_span(task_id=None, task=None, **kwargs):
+        carrier = {
+            field: getattr(task.request, field)
+            for field in propagate.get_global_textmap().fields
+            if getattr(task.request, field, None)
+        }
+        span = get_tracer().start_span(
+            task.name,
+            context=propagate.extract(carrier),
+            kind=SpanKind.CONSUMER,
+            attributes={"celery.task_id": task_id, "celery.retries": task.request.retries or 0}
+        )
+        token = otel_context.attach(trace.set_span_in_context(span))
+        _task_spans[task_id] = (span, token)
+
+    @signals.task_failure.connect(weak=False)
+    def _fail_task_span(task_id=None, exception=None, **kwargs):
+        entry = _task_spans.get(task_id)
+        if entry is not None and exception is not None:
+            _fail(entry[0], exception)
+
+    @signals.task_postrun.connect(weak=False)
+    def _end_task_span(task_id=None, state=None, **kwargs):
+        entry = _task_spans.pop(task_id, None)
+        if entry is not None:
+            span, token = entry
+            if state:
+                span.set_attribute("celery.state", state)
+            otel_context.detach(token)
+            span.end()
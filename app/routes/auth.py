@@ -4,7 +4,7 @@ from sqlalchemy import text
 from datetime import timedelta
 import os
 from ..models.user import User
-from ..utils.auth import get_password_hash, verify_password, create_token, verify_token
+from ..utils.auth import get_password_hash_async, verify_and_update_password, create_token, verify_token
 from fastapi.security import OAuth2PasswordBearer  # Change back to OAuth2PasswordBearer
 from pydantic import BaseModel
 from dotenv import load_dotenv
@@ -51,7 +51,7 @@ async def register(
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = User(username=user.username, email=user.email, hashed_password=hashed_password)
     
     db.add(new_user)
@@ -69,9 +69,16 @@ async def login(
     db: Session = Depends(get_db)
 ):
     db_user = db.query(User).filter(User.username == user.username).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    verified, new_hash = await verify_and_update_password(user.password, db_user.hashed_password)
+    if not verified:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        db_user.hashed_password = new_hash
+        db.commit()
+    
     access_token = create_token(
         data={"sub": user.username},
         expires_delta=timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 15)))
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 from datetime import datetime
 from ..models.enums import FileType
 
@@ -19,7 +19,46 @@ class FileInDB(FileBase):
     user_id: int
     file_url: str
     size: int
+    variants: Optional[Dict[str, str]] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
+
+class FilePage(BaseModel):
+    items: List[FileInDB]
+    next_cursor: Optional[str] = None
+
+class PresignUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+    size: int
+
+class PresignedUpload(BaseModel):
+    url: str
+    fields: Dict[str, str]
+    key: str
+    expires_in: int
+
+class UploadComplete(BaseModel):
+    key: str
+    filename: str
+
+class DedupeUpload(BaseModel):
+    sha256: str = Field(..., pattern="^[0-9a-f]{64}$")
+    filename: str
+
+class BulkFileIds(BaseModel):
+    ids: List[int]
+
+class BulkFetchResult(BaseModel):
+    items: List[FileInDB]
+    missing: List[int]
+
+class BulkDeleteItem(BaseModel):
+    id: int
+    status: str  # "deleted", "not_found" or "error"
+    detail: Optional[str] = None
+
+class BulkDeleteResult(BaseModel):
+    results: List[BulkDeleteItem]
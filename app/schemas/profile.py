@@ -1,5 +1,5 @@
 from pydantic import BaseModel, validator
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 class ProfileBase(BaseModel):
@@ -18,6 +18,7 @@ class ProfileInDB(ProfileBase):
     id: int
     user_id: int
     avatar_url: Optional[str] = None
+    avatar_variants: Optional[Dict[str, str]] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -30,6 +30,19 @@ class UserInDB(UserBase):
     class Config:
         from_attributes = True
 
+class UserPrincipal(BaseModel):
+    # Compact, immutable snapshot of the authenticated user used by deps
+    id: int
+    username: str
+    email: str
+    role: UserRole
+    is_active: bool
+    is_verified: bool
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
 class Token(BaseModel):
     access_token: str
     refresh_token: str
@@ -0,0 +1,104 @@
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Tuple
+from ..models.blob import Blob
+from ..models.file import File
+
+class BlobStore:
+    # Identical content is stored once and shared through Blob.ref_count.
+    # Counts only move through single UPDATE statements so concurrent uploads
+    # and deletes of the same content never lose a reference.
+    async def find_owned(self, db: AsyncSession, sha256: str, user_id: int) -> Optional[Blob]:
+        # Only blobs the caller already references can be claimed by hash
+        # alone; otherwise knowing a digest would grant access to the content
+        result = await db.execute(
+            select(Blob).join(File, File.blob_id == Blob.id).where(
+                Blob.sha256 == sha256,
+                File.user_id == user_id
+            ).limit(1)
+        )
+        return result.scalars().first()
+
+    async def _increment(self, db: AsyncSession, sha256: str) -> Optional[Blob]:
+        result = await db.execute(
+            update(Blob).where(Blob.sha256 == sha256).values(
+                ref_count=Blob.ref_count + 1
+            ).returning(Blob),
+            execution_options={"synchronize_session": False, "populate_existing": True}
+        )
+        return result.scalars().first()
+
+    async def acquire(
+        self,
+        db: AsyncSession,
+        sha256: str,
+        storage_key: str,
+        size: int,
+        mime_type: str
+    ) -> Tuple[Blob, bool]:
+        # Returns (blob, created). When created is False the content already
+        # existed and the object at storage_key is a redundant copy.
+        blob = await self._increment(db, sha256)
+        if blob is not None:
+            return blob, False
+
+        blob = Blob(sha256=sha256, storage_key=storage_key, size=size, mime_type=mime_type, ref_count=1)
+        try:
+            async with db.begin_nested():
+                db.add(blob)
+        except IntegrityError:
+            # Another upload of the same content won the insert
+            blob = await self._increment(db, sha256)
+            if blob is None:
+                raise
+            return blob, False
+        return blob, True
+
+    async def reference(self, db: AsyncSession, blob: Blob) -> Blob:
+        return await self._increment(db, blob.sha256)
+
+    async def release(self, db: AsyncSession, blob_id: int) -> Optional[str]:
+        # Drops one reference and returns the storage key once nothing uses it.
+        # The caller deletes the object only after committing, so a rollback
+        # never leaves rows pointing at missing content.
+        result = await db.execute(
+            update(Blob).where(Blob.id == blob_id).values(
+                ref_count=Blob.ref_count - 1
+            ).returning(Blob.ref_count, Blob.storage_key),
+            execution_options={"synchronize_session": False}
+        )
+        row = result.first()
+        if row is None or row.ref_count > 0:
+            return None
+
+        result = await db.execute(
+            delete(Blob).where(Blob.id == blob_id, Blob.ref_count <= 0),
+            execution_options={"synchronize_session": False}
+        )
+        if result.rowcount != 1:
+            return None
+        return row.storage_key
+
+    async def release_many(self, db: AsyncSession, counts: Dict[int, int]) -> List[str]:
+        # Bulk form of release(): counts maps blob id -> references dropped.
+        # Two statements whatever the number of blobs.
+        if not counts:
+            return []
+        result = await db.execute(
+            update(Blob).where(Blob.id.in_(list(counts))).values(
+                ref_count=Blob.ref_count - case(counts, value=Blob.id, else_=0)
+            ).returning(Blob.id, Blob.ref_count),
+            execution_options={"synchronize_session": False}
+        )
+        unreferenced = [row.id for row in result if row.ref_count <= 0]
+        if not unreferenced:
+            return []
+
+        result = await db.execute(
+            delete(Blob).where(Blob.id.in_(unreferenced), Blob.ref_count <= 0).returning(Blob.storage_key),
+            execution_options={"synchronize_session": False}
+        )
+        return list(result.scalars())
+
+blob_store = BlobStore()
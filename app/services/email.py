@@ -1,19 +1,40 @@
-from typing import Any, Dict
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from typing import Any, Dict, List
 from ..core.config import settings
-from pathlib import Path
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.SMTP_USER,
-    MAIL_PASSWORD=settings.SMTP_PASSWORD,
-    MAIL_FROM=settings.EMAILS_FROM_EMAIL,
-    MAIL_PORT=settings.SMTP_PORT,
-    MAIL_SERVER=settings.SMTP_HOST,
-    MAIL_TLS=settings.SMTP_TLS,
-    MAIL_SSL=False,
-    USE_CREDENTIALS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / "email-templates"
-)
+from .mail import build_message
+from .smtp import create_async_smtp_pool
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Authenticated SMTP sessions kept open across messages sent from this process
+mail_pool = create_async_smtp_pool()
+
+_email_batcher = None
+
+async def _send_inline(emails: List[Dict[str, Any]]) -> None:
+    logger.warning(f"Email queue unavailable, sending {len(emails)} emails inline")
+    for email in emails:
+        try:
+            await mail_pool.send_message(build_message(**email))
+        except Exception as e:
+            logger.error(f"Error sending email to {email['email_to']}: {e}")
+
+def get_email_batcher():
+    # Created on first use so inline delivery never imports the worker
+    global _email_batcher
+    if _email_batcher is None:
+        from ..tasks.worker import TaskBatcher, send_email_batch
+        _email_batcher = TaskBatcher(
+            send_email_batch,
+            settings.EMAIL_BATCH_SIZE,
+            settings.EMAIL_BATCH_WINDOW,
+            on_failure=_send_inline
+        )
+    return _email_batcher
+
+async def flush_email_queue() -> None:
+    if _email_batcher is not None:
+        await _email_batcher.flush()
 
 async def send_email(
     email_to: str,
@@ -21,15 +42,20 @@ async def send_email(
     template_name: str,
     environment: Dict[str, Any]
 ) -> None:
-    message = MessageSchema(
-        subject=subject,
-        recipients=[email_to],
-        template_body=environment,
-        subtype="html"
-    )
+    if settings.EMAIL_DELIVERY == "celery":
+        # Workers send each batch over one pooled SMTP session and retry with
+        # backoff; the message survives an API pod restart once it is on the
+        # broker
+        get_email_batcher().add({
+            "email_to": email_to,
+            "subject": subject,
+            "template_name": template_name,
+            "environment": environment
+        })
+        return
     
-    fm = FastMail(conf)
-    await fm.send_message(message, template_name=template_name)
+    message = build_message(email_to, subject, template_name, environment)
+    await mail_pool.send_message(message)
 
 async def send_verification_email(email_to: str, token: str) -> None:
     project_name = settings.PROJECT_NAME
@@ -0,0 +1,114 @@
+from concurrent.futures import Executor
+from typing import Dict, List, Tuple
+from PIL import Image, ImageOps
+from ..core.config import settings
+from ..storage.base import StorageBackend
+import asyncio
+import io
+import logging
+import posixpath
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TYPES = ["image/jpeg", "image/png", "image/gif", "image/webp"]
+
+FORMAT_CONTENT_TYPES = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+def variant_key(original_key: str, name: str) -> str:
+    # Variants live next to their original: blobs/<id>.png -> blobs/<id>/thumbnail.webp
+    stem, _ = posixpath.splitext(original_key)
+    return f"{stem}/{name}"
+
+def configured_variant_keys(original_key: str) -> List[str]:
+    return [
+        variant_key(original_key, f"{name}.{fmt}")
+        for name in settings.IMAGE_VARIANT_SIZES
+        for fmt in settings.IMAGE_VARIANT_FORMATS
+    ]
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    out = io.BytesIO()
+    if fmt == "jpeg":
+        if image.mode in ("RGBA", "LA", "P"):
+            # JPEG has no alpha; flatten onto white instead of black
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(out, "JPEG", quality=settings.IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+        image.save(out, "WEBP", quality=settings.IMAGE_WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+def render_variants(
+    data: bytes,
+    sizes: Dict[str, int] = None,
+    formats: List[str] = None
+) -> Dict[str, Tuple[bytes, str]]:
+    # CPU bound; runs inside a worker process. Returns {"thumbnail.webp": (bytes, content_type)}.
+    # Nothing from the source metadata is passed to save(), so EXIF (GPS,
+    # camera serials, ...) is dropped; orientation is applied to the pixels first.
+    sizes = sizes or settings.IMAGE_VARIANT_SIZES
+    formats = formats or settings.IMAGE_VARIANT_FORMATS
+    Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+
+    with Image.open(io.BytesIO(data)) as source:
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale, far cheaper than a full decode
+        largest = max(sizes.values())
+        source.draft(source.mode, (largest, largest))
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    variants = {}
+    # Largest first, each step resizes the previous result rather than the original
+    for name, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+        if max(image.size) > edge:
+            image = image.copy()
+            image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            variants[f"{name}.{fmt}"] = (_encode(image, fmt), FORMAT_CONTENT_TYPES[fmt])
+    return variants
+
+async def _read(storage: StorageBackend, key: str) -> bytes:
+    return b"".join([chunk async for chunk in storage.open(key)])
+
+async def _single(data: bytes):
+    yield data
+
+async def process_image(storage: StorageBackend, key: str, pool: Executor) -> Dict[str, str]:
+    # Downloads the original, renders in the pool and uploads every variant.
+    # Keys are derived from the original so a retry overwrites the same objects.
+    data = await _read(storage, key)
+    loop = asyncio.get_running_loop()
+    variants = await loop.run_in_executor(pool, render_variants, data)
+
+    urls = await asyncio.gather(*[
+        storage.save_stream(_single(body), variant_key(key, name), content_type)
+        for name, (body, content_type) in variants.items()
+    ])
+    return dict(zip(variants.keys(), urls))
+
+async def process_images(storage: StorageBackend, keys: List[str], pool: Executor) -> Dict[str, Dict[str, str]]:
+    # Runs a batch concurrently so downloads and uploads overlap with
+    # rendering in the pool; a bad image only fails its own entry
+    results = await asyncio.gather(
+        *[process_image(storage, key, pool) for key in keys],
+        return_exceptions=True
+    )
+    processed = {}
+    for key, result in zip(keys, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error processing image {key}: {result}")
+        else:
+            processed[key] = result
+    return processed
+
+def variant_keys(storage: StorageBackend, variants: Dict[str, str]) -> List[str]:
+    return [storage.key_from_url(url) for url in (variants or {}).values()]
@@ -0,0 +1,40 @@
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
+from pathlib import Path
+from typing import Any, Dict
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from ..core.config import settings
+
+TEMPLATE_FOLDER = Path(__file__).parent / "email-templates"
+
+# Shared by the Celery worker and the in-process sender. Jinja keeps compiled
+# templates in the environment; with auto_reload off it also skips the
+# per-render mtime check, so each file is read and compiled once per process.
+templates = Environment(
+    loader=FileSystemLoader(TEMPLATE_FOLDER),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False
+)
+
+def preload_templates() -> None:
+    # Compiles everything up front so the first email doesn't pay for it
+    for name in templates.list_templates():
+        templates.get_template(name)
+
+def render_template(template_name: str, environment: Dict[str, Any]) -> str:
+    return templates.get_template(template_name).render(**environment)
+
+def build_message(
+    email_to: str,
+    subject: str,
+    template_name: str,
+    environment: Dict[str, Any]
+) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["From"] = formataddr((settings.EMAILS_FROM_NAME or settings.PROJECT_NAME, settings.EMAILS_FROM_EMAIL))
+    message["To"] = email_to
+    message["Message-ID"] = make_msgid()
+    message.set_content("This message requires an HTML capable email client.")
+    message.add_alternative(render_template(template_name, environment), subtype="html")
+    return message
@@ -1,13 +1,22 @@
 import boto3
 from botocore.exceptions import ClientError
+from starlette.concurrency import run_in_threadpool
 from ..core.config import settings
+from ..monitoring.tracing import instrument_boto_client
+from ..storage.base import content_disposition
+from .upload import SNIFF_BYTES, sniff_content_type
+import asyncio
 import logging
 from fastapi import UploadFile
-import uuid
+from typing import AsyncIterable, Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+DELETE_BATCH_SIZE = 1000  # S3 DeleteObjects limit
+
 class S3Service:
+    # boto3 is synchronous, so every call runs on the threadpool to keep the
+    # event loop free.
     def __init__(self):
         self.s3_client = boto3.client(
             's3',
@@ -15,39 +24,238 @@ class S3Service:
             aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
         )
         self.bucket = settings.AWS_BUCKET_NAME
+        instrument_boto_client(self.s3_client)
+
+    def url_for(self, key: str) -> str:
+        return f"https://{self.bucket}.s3.amazonaws.com/{key}"
+
+    def key_from_url(self, file_url: str) -> str:
+        return file_url.split(f"{self.bucket}.s3.amazonaws.com/")[1]
+
+    async def presign_upload(
+        self,
+        key: str,
+        content_type: str,
+        max_size: int,
+        expires_in: int = None
+    ) -> Dict:
+        # S3 itself enforces the size range and content type in the POST policy
+        return await run_in_threadpool(
+            self.s3_client.generate_presigned_post,
+            Bucket=self.bucket,
+            Key=key,
+            Fields={"Content-Type": content_type},
+            Conditions=[
+                {"Content-Type": content_type},
+                ["content-length-range", 1, max_size]
+            ],
+            ExpiresIn=expires_in or settings.PRESIGNED_URL_EXPIRE_SECONDS
+        )
+
+    async def presign_download(self, key: str, filename: Optional[str] = None, expires_in: int = None) -> str:
+        params = {"Bucket": self.bucket, "Key": key}
+        if filename:
+            params["ResponseContentDisposition"] = content_disposition(filename)
+        return await run_in_threadpool(
+            self.s3_client.generate_presigned_url,
+            "get_object",
+            Params=params,
+            ExpiresIn=expires_in or settings.PRESIGNED_URL_EXPIRE_SECONDS
+        )
+
+    async def verify_upload(self, key: str, allowed_types: List[str], max_size: int) -> Tuple[int, str]:
+        # Checks an object uploaded directly by a client; only its first bytes
+        # are read to sniff the real type
+        try:
+            response = await run_in_threadpool(
+                self.s3_client.get_object,
+                Bucket=self.bucket,
+                Key=key,
+                Range=f"bytes=0-{SNIFF_BYTES - 1}"
+            )
+        except ClientError as e:
+            raise ValueError("Upload not found") from e
+
+        head = await run_in_threadpool(response["Body"].read)
+        size = int(response["ContentRange"].split("/")[-1]) if "ContentRange" in response else len(head)
+        content_type = sniff_content_type(head)
+        if size > max_size:
+            raise ValueError("File too large")
+        if content_type is None or content_type not in allowed_types:
+            raise ValueError("File type not allowed")
+        return size, content_type
+
+    async def delete_key(self, key: str) -> bool:
+        try:
+            await run_in_threadpool(self.s3_client.delete_object, Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            logger.error(f"Error deleting file from S3: {e}")
+            return False
+
+    async def _delete_batch(self, keys: List[str]) -> Dict[str, bool]:
+        try:
+            response = await run_in_threadpool(
+                self.s3_client.delete_objects,
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True}
+            )
+        except ClientError as e:
+            logger.error(f"Error deleting {len(keys)} files from S3: {e}")
+            return {key: False for key in keys}
 
-    async def upload_file(self, file: UploadFile, folder: str = "uploads") -> str:
+        # Quiet mode only reports failures
+        results = {key: True for key in keys}
+        for error in response.get("Errors", []):
+            logger.error(f"Error deleting {error['Key']} from S3: {error.get('Message')}")
+            results[error["Key"]] = False
+        return results
+
+    async def delete_keys(self, keys: List[str]) -> Dict[str, bool]:
+        # DeleteObjects takes up to 1000 keys per call; batches run concurrently
+        keys = list(dict.fromkeys(keys))
+        batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+        results = {}
+        for batch_result in await asyncio.gather(*[self._delete_batch(batch) for batch in batches]):
+            results.update(batch_result)
+        return results
+
+    async def upload_file(self, file: UploadFile, key: str) -> str:
         try:
-            file_extension = file.filename.split('.')[-1]
-            unique_filename = f"{folder}/{str(uuid.uuid4())}.{file_extension}"
-            
-            await self.s3_client.upload_fileobj(
+            await run_in_threadpool(
+                self.s3_client.upload_fileobj,
                 file.file,
                 self.bucket,
-                unique_filename,
+                key,
                 ExtraArgs={
                     "ContentType": file.content_type
                 }
             )
-            
-            url = f"https://{self.bucket}.s3.amazonaws.com/{unique_filename}"
-            return url
-            
+
+            return self.url_for(key)
+
         except ClientError as e:
             logger.error(f"Error uploading file to S3: {e}")
             raise
 
+    async def _upload_part(
+        self,
+        slots: asyncio.Semaphore,
+        key: str,
+        upload_id: str,
+        part_number: int,
+        body: bytes
+    ) -> Dict:
+        try:
+            response = await run_in_threadpool(
+                self.s3_client.upload_part,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=body
+            )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+        finally:
+            slots.release()
+
+    async def upload_stream(self, chunks: AsyncIterable[bytes], key: str, content_type: str) -> str:
+        # Small bodies become a single PUT. Larger ones are split into parts
+        # uploaded concurrently; the semaphore bounds parts in flight, so memory
+        # stays at roughly (concurrency + 1) * part size whatever the file size.
+        part_size = settings.S3_MULTIPART_CHUNK_SIZE
+        slots = asyncio.Semaphore(settings.S3_MULTIPART_CONCURRENCY)
+        buffer = bytearray()
+        upload_id = None
+        tasks: List[asyncio.Task] = []
+
+        def raise_failed_part() -> None:
+            # Stop reading the body as soon as any part has failed
+            for task in tasks:
+                if task.done() and task.exception() is not None:
+                    raise task.exception()
+
+        async def submit_part(body: bytes) -> None:
+            raise_failed_part()
+            await slots.acquire()
+            try:
+                raise_failed_part()
+            except BaseException:
+                slots.release()
+                raise
+            tasks.append(asyncio.create_task(
+                self._upload_part(slots, key, upload_id, len(tasks) + 1, body)
+            ))
+
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                while len(buffer) >= part_size:
+                    if upload_id is None:
+                        response = await run_in_threadpool(
+                            self.s3_client.create_multipart_upload,
+                            Bucket=self.bucket,
+                            Key=key,
+                            ContentType=content_type
+                        )
+                        upload_id = response["UploadId"]
+                    body = bytes(buffer[:part_size])
+                    del buffer[:part_size]
+                    await submit_part(body)
+
+            if upload_id is None:
+                await run_in_threadpool(
+                    self.s3_client.put_object,
+                    Bucket=self.bucket,
+                    Key=key,
+                    Body=bytes(buffer),
+                    ContentType=content_type
+                )
+            else:
+                if buffer:
+                    await submit_part(bytes(buffer))
+                parts = await asyncio.gather(*tasks)
+                await run_in_threadpool(
+                    self.s3_client.complete_multipart_upload,
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+        except BaseException as e:
+            for task in tasks:
+                task.cancel()
+            # Parts still in flight would otherwise land after the abort and
+            # leave billable storage behind
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if upload_id is not None:
+                try:
+                    await asyncio.shield(run_in_threadpool(
+                        self.s3_client.abort_multipart_upload,
+                        Bucket=self.bucket,
+                        Key=key,
+                        UploadId=upload_id
+                    ))
+                except Exception as abort_error:
+                    logger.error(f"Error aborting multipart upload {upload_id}: {abort_error}")
+            if isinstance(e, ClientError):
+                logger.error(f"Error uploading file to S3: {e}")
+            raise
+
+        return self.url_for(key)
+
     async def delete_file(self, file_url: str) -> bool:
         try:
             # Extract key from URL
-            key = file_url.split(f"{self.bucket}.s3.amazonaws.com/")[1]
-            
-            await self.s3_client.delete_object(
+            key = self.key_from_url(file_url)
+
+            await run_in_threadpool(
+                self.s3_client.delete_object,
                 Bucket=self.bucket,
                 Key=key
             )
             return True
-            
+
         except ClientError as e:
             logger.error(f"Error deleting file from S3: {e}")
             return False
@@ -0,0 +1,326 @@
+from contextlib import asynccontextmanager, contextmanager
+from email.message import EmailMessage
+from typing import AsyncIterator, Iterator, List, Optional
+import asyncio
+import smtplib
+import ssl
+import threading
+import time
+import logging
+import aiosmtplib
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def is_permanent_failure(error: Exception) -> bool:
+    # 5xx replies and refused recipients won't succeed on retry
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, aiosmtplib.SMTPRecipientsRefused)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return error.code >= 500
+    return False
+
+class _TrackedSMTP(smtplib.SMTP):
+    # Set once the current transaction reaches DATA, after which the server
+    # may have accepted the message even if the session drops
+    in_data = False
+
+    def data(self, msg):
+        self.in_data = True
+        return super().data(msg)
+
+class _TrackedAsyncSMTP(aiosmtplib.SMTP):
+    in_data = False
+
+    async def data(self, message, **kwargs):
+        self.in_data = True
+        return await super().data(message, **kwargs)
+
+class _PooledSMTP:
+    __slots__ = ("client", "sent", "last_used")
+
+    def __init__(self, client: smtplib.SMTP):
+        self.client = client
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+class SMTPConnectionPool:
+    # Keeps authenticated SMTP sessions open between messages so a burst of
+    # mail costs one TCP/TLS handshake and login per connection, not per
+    # message. Thread safe; used from the Celery worker.
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: bool = True,
+        timeout: float = 10,
+        size: int = 2,
+        max_messages: int = 100,
+        idle_check: float = 30
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.idle_check = idle_check
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: List[_PooledSMTP] = []
+        self._lock = threading.Lock()
+
+    def _open(self) -> _PooledSMTP:
+        client = _TrackedSMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                client.starttls(context=ssl.create_default_context())
+            if self.username and self.password:
+                client.login(self.username, self.password)
+        except Exception:
+            client.close()
+            raise
+        return _PooledSMTP(client)
+
+    def _alive(self, connection: _PooledSMTP) -> bool:
+        # Servers drop idle sessions; probe only connections that sat unused
+        if time.monotonic() - connection.last_used < self.idle_check:
+            return True
+        try:
+            return connection.client.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def _discard(self, connection: _PooledSMTP) -> None:
+        try:
+            connection.client.quit()
+        except Exception:
+            connection.client.close()
+
+    def _checkout(self) -> _PooledSMTP:
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                return self._open()
+            if self._alive(connection):
+                return connection
+            self._discard(connection)
+
+    def _checkin(self, connection: _PooledSMTP) -> None:
+        connection.last_used = time.monotonic()
+        if connection.sent >= self.max_messages:
+            self._discard(connection)
+            return
+        with self._lock:
+            self._idle.append(connection)
+
+    @contextmanager
+    def connection(self) -> Iterator[_PooledSMTP]:
+        self._slots.acquire()
+        try:
+            connection = self._checkout()
+            try:
+                yield connection
+            except BaseException:
+                connection.client.close()
+                raise
+            self._checkin(connection)
+        finally:
+            self._slots.release()
+
+    def send_message(self, message: EmailMessage) -> None:
+        errors = self.send_messages([message])
+        if errors[0] is not None:
+            raise errors[0]
+
+    def send_messages(self, messages: List[EmailMessage]) -> List[Optional[Exception]]:
+        # Sends a batch over one session and returns one error (or None) per
+        # message. A dropped connection is reopened once and the batch resumes;
+        # a message whose DATA had started is reported, not resent, since the
+        # server may already have queued it.
+        errors: List[Optional[Exception]] = [None] * len(messages)
+        index = 0
+        reconnected = False
+        while index < len(messages):
+            connection = None
+            try:
+                with self.connection() as connection:
+                    while index < len(messages):
+                        connection.client.in_data = False
+                        try:
+                            connection.client.send_message(messages[index])
+                            connection.sent += 1
+                        except smtplib.SMTPServerDisconnected:
+                            raise
+                        except smtplib.SMTPException as e:
+                            # smtplib resets the transaction itself; the session stays usable
+                            errors[index] = e
+                        index += 1
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                if connection is not None and connection.client.in_data:
+                    errors[index] = e
+                    index += 1
+                if reconnected:
+                    for pending in range(index, len(messages)):
+                        errors[pending] = e
+                    break
+                logger.warning(f"SMTP connection lost, reconnecting: {e}")
+                reconnected = True
+            except smtplib.SMTPException as e:
+                # Connecting or logging in failed (SMTPConnectError,
+                # SMTPAuthenticationError, ...); nothing was sent
+                for pending in range(index, len(messages)):
+                    errors[pending] = e
+                break
+        return errors
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._discard(connection)
+
+class _PooledAsyncSMTP:
+    __slots__ = ("client", "sent", "last_used")
+
+    def __init__(self, client: _TrackedAsyncSMTP):
+        self.client = client
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+class AsyncSMTPConnectionPool:
+    # asyncio counterpart of SMTPConnectionPool for sending from the API
+    # process when no Celery worker is deployed
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: bool = True,
+        timeout: float = 10,
+        size: int = 2,
+        max_messages: int = 100,
+        idle_check: float = 30
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.idle_check = idle_check
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[_PooledAsyncSMTP] = []
+
+    async def _open(self) -> _PooledAsyncSMTP:
+        client = _TrackedAsyncSMTP(
+            hostname=self.host,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            timeout=self.timeout,
+            start_tls=self.use_tls
+        )
+        await client.connect()
+        return _PooledAsyncSMTP(client)
+
+    async def _alive(self, connection: _PooledAsyncSMTP) -> bool:
+        if not connection.client.is_connected:
+            return False
+        if time.monotonic() - connection.last_used < self.idle_check:
+            return True
+        try:
+            response = await connection.client.noop()
+            return response.code == 250
+        except aiosmtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    async def _discard(self, connection: _PooledAsyncSMTP) -> None:
+        try:
+            await connection.client.quit()
+        except Exception:
+            connection.client.close()
+
+    async def _checkout(self) -> _PooledAsyncSMTP:
+        while self._idle:
+            connection = self._idle.pop()
+            if await self._alive(connection):
+                return connection
+            await self._discard(connection)
+        return await self._open()
+
+    async def _checkin(self, connection: _PooledAsyncSMTP) -> None:
+        connection.last_used = time.monotonic()
+        if connection.sent >= self.max_messages:
+            await self._discard(connection)
+        else:
+            self._idle.append(connection)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[_PooledAsyncSMTP]:
+        async with self._slots:
+            connection = await self._checkout()
+            try:
+                yield connection
+            except BaseException:
+                connection.client.close()
+                raise
+            await self._checkin(connection)
+
+    async def send_message(self, message: EmailMessage) -> None:
+        # A session the server dropped is replaced once before giving up, but
+        # only if the drop came before DATA: afterwards the message may already
+        # be queued for delivery and resending could deliver it twice, so the
+        # error goes to the caller instead (at-most-once from that point on)
+        for attempt in range(2):
+            connection = None
+            try:
+                async with self.connection() as connection:
+                    connection.client.in_data = False
+                    await connection.client.send_message(message)
+                    connection.sent += 1
+                return
+            except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, OSError) as e:
+                if attempt or (connection is not None and connection.client.in_data):
+                    raise
+                logger.warning(f"SMTP connection lost, reconnecting: {e}")
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await self._discard(connection)
+
+def create_async_smtp_pool() -> AsyncSMTPConnectionPool:
+    return AsyncSMTPConnectionPool(
+        settings.SMTP_HOST,
+        settings.SMTP_PORT,
+        username=settings.SMTP_USER,
+        password=settings.SMTP_PASSWORD,
+        use_tls=settings.SMTP_TLS,
+        timeout=settings.SMTP_TIMEOUT,
+        size=settings.SMTP_POOL_SIZE,
+        max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION
+    )
+
+def create_smtp_pool() -> SMTPConnectionPool:
+    return SMTPConnectionPool(
+        settings.SMTP_HOST,
+        settings.SMTP_PORT,
+        username=settings.SMTP_USER,
+        password=settings.SMTP_PASSWORD,
+        use_tls=settings.SMTP_TLS,
+        timeout=settings.SMTP_TIMEOUT,
+        size=settings.SMTP_POOL_SIZE,
+        max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION
+    )
@@ -0,0 +1,184 @@
+from typing import AsyncIterable, AsyncIterator, List, Optional
+from fastapi import HTTPException, Request
+from ..core.config import settings
+import hashlib
+
+try:
+    import python_multipart as multipart
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import parse_options_header
+
+# Magic numbers for the types we accept; the client's Content-Type is not trusted
+SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"%PDF-", "application/pdf"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+SNIFF_BYTES = 16
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+class UploadStream:
+    # Streams one file field out of a multipart request body without
+    # spooling it: size limits and type sniffing are enforced as bytes arrive.
+    def __init__(
+        self,
+        request: Request,
+        field_name: str = "file",
+        max_size: int = None,
+        allowed_types: List[str] = None
+    ):
+        self.request = request
+        self.field_name = field_name
+        self.max_size = max_size or settings.MAX_UPLOAD_SIZE
+        self.allowed_types = allowed_types or settings.ALLOWED_FILE_TYPES
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.size = 0
+
+        self._body = None
+        self._parser = None
+        self._pending: List[bytes] = []
+        self._head = b""
+        self._header_field = b""
+        self._headers = {}
+        self._in_target = False
+        self._found = False
+        self._done = False
+
+    # Parser callbacks (synchronous, fed from start()/__aiter__)
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        field = self._header_field.lower()
+        self._headers[field] = self._headers.get(field, b"") + data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._header_field = b""
+
+    def _on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode()
+        self._in_target = not self._found and name == self.field_name
+        if self._in_target:
+            self._found = True
+            self.filename = options.get(b"filename", b"").decode() or None
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_target:
+            self._pending.append(data[start:end])
+
+    def _on_part_end(self) -> None:
+        if self._in_target:
+            self._in_target = False
+            self._done = True
+
+    def _check_size(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise HTTPException(status_code=413, detail="File too large")
+
+    def _sniff(self) -> None:
+        content_type = sniff_content_type(self._head)
+        if content_type is None or content_type not in self.allowed_types:
+            raise HTTPException(status_code=400, detail="File type not allowed")
+        self.content_type = content_type
+
+    async def _feed(self) -> bool:
+        # Pushes the next body chunk through the parser; False once exhausted
+        try:
+            try:
+                chunk = await self._body.__anext__()
+            except StopAsyncIteration:
+                self._parser.finalize()
+                return False
+            self._parser.write(chunk)
+            return True
+        except FormParserError:
+            raise HTTPException(status_code=400, detail="Malformed multipart body")
+
+    async def start(self) -> None:
+        # Reads until the file's headers and first bytes are known, so the
+        # caller can validate and pick a storage key before streaming
+        content_type, options = parse_options_header(self.request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+
+        content_length = self.request.headers.get("content-length")
+        if content_length and int(content_length) > self.max_size + 64 * 1024:
+            raise HTTPException(status_code=413, detail="File too large")
+
+        self._body = self.request.stream().__aiter__()
+        self._parser = multipart.MultipartParser(options[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+        while len(self._head) < SNIFF_BYTES and not self._done:
+            more = await self._feed()
+            for data in self._pending:
+                self._check_size(data)
+                self._head += data
+            self._pending.clear()
+            if not more:
+                break
+
+        if not self._found:
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        self._sniff()
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self._iter_chunks()
+
+    async def _iter_chunks(self) -> AsyncIterator[bytes]:
+        if self._body is None:
+            await self.start()
+        if self._head:
+            yield self._head
+        while not self._done:
+            more = await self._feed()
+            pending, self._pending = self._pending, []
+            for data in pending:
+                self._check_size(data)
+                yield data
+            if not more:
+                break
+
+class HashingStream:
+    # Passes chunks through unchanged while feeding them to SHA-256, so the
+    # digest is ready the moment the upload finishes without a second read
+    def __init__(self, chunks: AsyncIterable[bytes]):
+        self.chunks = chunks
+        self._hash = hashlib.sha256()
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self._iter_chunks()
+
+    async def _iter_chunks(self) -> AsyncIterator[bytes]:
+        async for chunk in self.chunks:
+            self._hash.update(chunk)
+            yield chunk
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
@@ -0,0 +1,70 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from fastapi import UploadFile
+from fastapi.responses import Response
+from urllib.parse import quote
+import asyncio
+import uuid
+
+def content_disposition(filename: str) -> str:
+    # RFC 6266: a plain ASCII fallback (no quotes, backslashes or control
+    # characters that could break out of the header) plus the exact name
+    # percent-encoded in filename* (RFC 5987)
+    fallback = "".join(c if " " <= c <= "~" and c not in '"\\' else "_" for c in filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+# Common interface for where file bytes live. Endpoints only deal with keys
+# and URLs; the configured backend decides how bytes are stored and served.
+class StorageBackend(ABC):
+    supports_presigned = False
+
+    def build_key(self, folder: str, filename: Optional[str]) -> str:
+        file_extension = filename.split('.')[-1] if filename and '.' in filename else "bin"
+        return f"{folder}/{str(uuid.uuid4())}.{file_extension}"
+
+    @abstractmethod
+    def url_for(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    def key_from_url(self, file_url: str) -> str:
+        ...
+
+    @abstractmethod
+    async def save_stream(self, chunks: AsyncIterable[bytes], key: str, content_type: str) -> str:
+        ...
+
+    async def save_file(self, file: UploadFile, folder: str = "uploads") -> str:
+        key = self.build_key(folder, file.filename)
+
+        async def chunks():
+            while True:
+                data = await file.read(64 * 1024)
+                if not data:
+                    break
+                yield data
+
+        return await self.save_stream(chunks(), key, file.content_type)
+
+    @abstractmethod
+    def open(self, key: str) -> AsyncIterator[bytes]:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> bool:
+        ...
+
+    async def delete_many(self, keys: Iterable[str]) -> Dict[str, bool]:
+        keys = list(dict.fromkeys(keys))
+        results = await asyncio.gather(*[self.delete(key) for key in keys])
+        return dict(zip(keys, results))
+
+    @abstractmethod
+    async def download_response(self, key: str, filename: Optional[str], content_type: Optional[str]) -> Response:
+        ...
+
+    async def presign_upload(self, key: str, content_type: str, max_size: int, expires_in: int = None) -> Dict:
+        raise NotImplementedError("Direct uploads are not supported by this storage backend")
+
+    async def verify_upload(self, key: str, allowed_types: List[str], max_size: int) -> Tuple[int, str]:
+        raise NotImplementedError("Direct uploads are not supported by this storage backend")
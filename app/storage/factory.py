@@ -0,0 +1,17 @@
+from functools import lru_cache
+from ..core.config import settings
+from .base import StorageBackend
+
+@lru_cache()
+def get_storage() -> StorageBackend:
+    backend = settings.STORAGE_BACKEND
+    if backend == "s3":
+        from .s3 import S3Storage
+        return S3Storage()
+    if backend == "local":
+        from .local import LocalStorage
+        return LocalStorage(settings.LOCAL_STORAGE_ROOT, settings.LOCAL_STORAGE_URL_PREFIX)
+    if backend == "memory":
+        from .memory import InMemoryStorage
+        return InMemoryStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
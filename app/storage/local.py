@@ -0,0 +1,68 @@
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Optional
+from uuid import uuid4
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, Response
+import aiofiles
+import aiofiles.os
+from .base import StorageBackend
+
+CHUNK_SIZE = 64 * 1024
+
+# Stores files on local disk for on-prem deployments. Writes stream to a
+# temporary file that is renamed into place; downloads use FileResponse,
+# which supports Range requests and lets the server use sendfile.
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str, url_prefix: str):
+        self.root = Path(root).resolve()
+        self.url_prefix = url_prefix.rstrip("/")
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def key_from_url(self, file_url: str) -> str:
+        return file_url[len(self.url_prefix) + 1:]
+
+    async def save_stream(self, chunks: AsyncIterable[bytes], key: str, content_type: str) -> str:
+        path = self._path(key)
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid4().hex}.part")
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out_file:
+                async for data in chunks:
+                    await out_file.write(data)
+            await aiofiles.os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                await aiofiles.os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return self.url_for(key)
+
+    async def open(self, key: str) -> AsyncIterator[bytes]:
+        async with aiofiles.open(self._path(key), "rb") as in_file:
+            while True:
+                data = await in_file.read(CHUNK_SIZE)
+                if not data:
+                    break
+                yield data
+
+    async def delete(self, key: str) -> bool:
+        try:
+            await aiofiles.os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def download_response(self, key: str, filename: Optional[str], content_type: Optional[str]) -> Response:
+        path = self._path(key)
+        if not await aiofiles.os.path.exists(path):
+            raise HTTPException(status_code=404, detail="File not found")
+        return FileResponse(path, media_type=content_type, filename=filename)
@@ -0,0 +1,42 @@
+from typing import AsyncIterable, AsyncIterator, Dict, Optional
+from fastapi import HTTPException
+from fastapi.responses import Response
+from .base import StorageBackend, content_disposition
+
+# Keeps objects in a dict; meant for tests and local experiments
+class InMemoryStorage(StorageBackend):
+    def __init__(self, url_prefix: str = "memory://"):
+        self.url_prefix = url_prefix
+        self.objects: Dict[str, bytes] = {}
+        self.content_types: Dict[str, str] = {}
+
+    def url_for(self, key: str) -> str:
+        return f"{self.url_prefix}{key}"
+
+    def key_from_url(self, file_url: str) -> str:
+        return file_url[len(self.url_prefix):]
+
+    async def save_stream(self, chunks: AsyncIterable[bytes], key: str, content_type: str) -> str:
+        data = bytearray()
+        async for chunk in chunks:
+            data += chunk
+        self.objects[key] = bytes(data)
+        self.content_types[key] = content_type
+        return self.url_for(key)
+
+    async def open(self, key: str) -> AsyncIterator[bytes]:
+        yield self.objects[key]
+
+    async def delete(self, key: str) -> bool:
+        self.content_types.pop(key, None)
+        return self.objects.pop(key, None) is not None
+
+    async def download_response(self, key: str, filename: Optional[str], content_type: Optional[str]) -> Response:
+        if key not in self.objects:
+            raise HTTPException(status_code=404, detail="File not found")
+        headers = {"Content-Disposition": content_disposition(filename)} if filename else None
+        return Response(
+            self.objects[key],
+            media_type=content_type or self.content_types.get(key),
+            headers=headers
+        )
@@ -0,0 +1,56 @@
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from fastapi import UploadFile
+from fastapi.responses import RedirectResponse, Response
+from starlette.concurrency import run_in_threadpool
+from ..services.s3 import S3Service
+from .base import StorageBackend
+
+class S3Storage(StorageBackend):
+    supports_presigned = True
+
+    def __init__(self, service: Optional[S3Service] = None):
+        self.service = service or S3Service()
+
+    def url_for(self, key: str) -> str:
+        return self.service.url_for(key)
+
+    def key_from_url(self, file_url: str) -> str:
+        return self.service.key_from_url(file_url)
+
+    async def save_stream(self, chunks: AsyncIterable[bytes], key: str, content_type: str) -> str:
+        return await self.service.upload_stream(chunks, key, content_type)
+
+    async def save_file(self, file: UploadFile, folder: str = "uploads") -> str:
+        # Keys come from StorageBackend.build_key like every other backend
+        return await self.service.upload_file(file, self.build_key(folder, file.filename))
+
+    async def open(self, key: str) -> AsyncIterator[bytes]:
+        response = await run_in_threadpool(
+            self.service.s3_client.get_object, Bucket=self.service.bucket, Key=key
+        )
+        body = response["Body"]
+        try:
+            while True:
+                data = await run_in_threadpool(body.read, 1024 * 1024)
+                if not data:
+                    break
+                yield data
+        finally:
+            body.close()
+
+    async def delete(self, key: str) -> bool:
+        return await self.service.delete_key(key)
+
+    async def delete_many(self, keys: Iterable[str]) -> Dict[str, bool]:
+        return await self.service.delete_keys(list(keys))
+
+    async def download_response(self, key: str, filename: Optional[str], content_type: Optional[str]) -> Response:
+        # Clients fetch the bytes from S3 itself
+        url = await self.service.presign_download(key, filename)
+        return RedirectResponse(url, status_code=307)
+
+    async def presign_upload(self, key: str, content_type: str, max_size: int, expires_in: int = None) -> Dict:
+        return await self.service.presign_upload(key, content_type, max_size, expires_in)
+
+    async def verify_upload(self, key: str, allowed_types: List[str], max_size: int) -> Tuple[int, str]:
+        return await self.service.verify_upload(key, allowed_types, max_size)
@@ -1,6 +1,28 @@
 from celery import Celery
+from celery.concurrency import get_implementation
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
+from concurrent.futures import ProcessPoolExecutor
+from redis import Redis
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import update
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
 from ..core.config import settings
+from ..database import SessionLocal
+from ..monitoring.tracing import instrument_celery, instrument_redis, setup_tracing
+from ..models.file import File
+from ..models.profile import Profile
+from ..models.user import User
+from ..cache.invalidation import invalidation_bus
+from ..cache.redis_cache import RedisCache, user_tag
+from ..services.images import IMAGE_TYPES, process_images, variant_keys
+from ..services.mail import build_message
+from ..services.smtp import SMTPConnectionPool, create_smtp_pool, is_permanent_failure
+from ..storage.factory import get_storage
+import asyncio
 import logging
+import random
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -10,26 +32,297 @@ celery_app = Celery(
     backend=settings.REDIS_URL
 )
 
+# Image tasks get their own queue. Serve it with a thread pool worker, e.g.
+#   celery -A app.tasks.worker worker -Q images -P threads -c 4
+# Prefork children are daemonic and cannot start the process pool that does
+# the actual rendering; the threads only wait on storage and the database.
 celery_app.conf.task_routes = {
+    "app.tasks.worker.process_*": {"queue": "images"},
     "app.tasks.worker.*": {"queue": "main-queue"}
 }
 
-@celery_app.task(acks_late=True)
-def process_uploaded_file(file_id: int):
+# Publishers put the trace context in task headers; workers continue it
+instrument_celery()
+
+# The span exporter owns a thread and a connection, so it is set up in the
+# process that runs tasks: prefork children after forking, otherwise the
+# worker itself (threads, solo)
+@worker_process_init.connect
+def _setup_tracing(**kwargs):
+    setup_tracing(f"{settings.PROJECT_NAME} worker")
+
+@worker_init.connect
+def _setup_tracing_without_fork(sender=None, **kwargs):
+    if get_implementation(sender.pool_cls) is not PreforkPool:
+        setup_tracing(f"{settings.PROJECT_NAME} worker")
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+_image_pool_lock = threading.Lock()
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            _image_pool = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+        return _image_pool
+
+_smtp_pool: Optional[SMTPConnectionPool] = None
+_smtp_pool_lock = threading.Lock()
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    # One pool per worker process; its connections outlive individual tasks
+    global _smtp_pool
+    with _smtp_pool_lock:
+        if _smtp_pool is None:
+            _smtp_pool = create_smtp_pool()
+        return _smtp_pool
+
+@worker_process_shutdown.connect
+def _shutdown_image_pool(**kwargs):
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+    if _smtp_pool is not None:
+        _smtp_pool.close()
+
+async def enqueue(task, *args) -> bool:
+    # Called from the API: publishing to the broker blocks, and processing is
+    # best effort, so a broker outage must not fail the request
     try:
-        # Add file processing logic here
-        logger.info(f"Processing file {file_id}")
+        await run_in_threadpool(task.delay, *args)
         return True
     except Exception as e:
-        logger.error(f"Error processing file {file_id}: {e}")
+        logger.error(f"Error enqueuing {task.name}: {e}")
         return False
 
+class TaskBatcher:
+    # Collects items submitted from the API for a short window and enqueues
+    # them as one call of a list-taking task, so a burst costs one broker
+    # round-trip and one worker task. A full batch goes out immediately.
+    def __init__(
+        self,
+        task,
+        max_size: int,
+        window: float,
+        on_failure: Optional[Callable[[List[Any]], Awaitable[None]]] = None
+    ):
+        self.task = task
+        self.max_size = max_size
+        self.window = window
+        self.on_failure = on_failure
+        self._items: List[Any] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._publishing: Set[asyncio.Task] = set()
+
+    def add(self, item: Any) -> None:
+        self._items.append(item)
+        if len(self._items) >= self.max_size:
+            task = asyncio.create_task(self._publish(self._take()))
+            self._publishing.add(task)
+            task.add_done_callback(self._publishing.discard)
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._publish_later())
+
+    def _take(self) -> List[Any]:
+        items, self._items = self._items, []
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        return items
+
+    async def _publish_later(self) -> None:
+        await asyncio.sleep(self.window)
+        await self._publish(self._take())
+
+    async def _publish(self, items: List[Any]) -> None:
+        if not items or await enqueue(self.task, items):
+            return
+        if self.on_failure is not None:
+            try:
+                await self.on_failure(items)
+            except Exception as e:
+                logger.error(f"Error handling {len(items)} unqueued {self.task.name} items: {e}")
+
+    async def flush(self) -> None:
+        # Publishes whatever is still buffered; called on shutdown
+        await self._publish(self._take())
+        if self._publishing:
+            await asyncio.gather(*self._publishing, return_exceptions=True)
+
+def _invalidate_tags(*tags: str) -> None:
+    # Same effect as cache.invalidate_tags, using a plain client because the
+    # async one is bound to the API's event loop
+    tag_keys = [RedisCache._tag_key(tag) for tag in tags]
+    try:
+        with Redis.from_url(settings.REDIS_URL) as redis:
+            instrument_redis(redis)
+            pipe = redis.pipeline(transaction=False)
+            for tag_key in tag_keys:
+                pipe.incr(tag_key)
+            pipe.publish(invalidation_bus.channel, invalidation_bus.message(*tag_keys))
+            pipe.execute()
+    except Exception as e:
+        logger.error(f"Cache invalidation error: {e}")
+
+def _discard_variants(variants: Dict[str, str]) -> None:
+    # The row went away while rendering; don't leave the variants behind
+    storage = get_storage()
+
+    async def delete_all():
+        await storage.delete_many(variant_keys(storage, variants))
+
+    asyncio.run(delete_all())
+
 @celery_app.task(acks_late=True)
-def send_email_notification(user_id: int, subject: str, message: str):
+def process_uploaded_files(file_ids: List[int]):
+    storage = get_storage()
+    db = SessionLocal()
+    try:
+        files = db.query(File).filter(
+            File.id.in_(file_ids),
+            File.mime_type.in_(IMAGE_TYPES),
+            File.variants.is_(None)
+        ).all()
+
+        # Files sharing a blob have identical bytes; render each blob once and
+        # reuse what an earlier upload of the same content already produced
+        pending: Dict[str, List[File]] = {}
+        done: Dict[int, Dict[str, str]] = {}
+        for file in files:
+            if file.blob_id is not None:
+                sibling = db.query(File.variants).filter(
+                    File.blob_id == file.blob_id,
+                    File.variants.is_not(None)
+                ).first()
+                if sibling:
+                    done[file.id] = sibling.variants
+                    continue
+            pending.setdefault(storage.key_from_url(file.file_url), []).append(file)
+
+        results = asyncio.run(process_images(storage, list(pending), get_image_pool()))
+
+        orphaned = []
+        for key, variants in results.items():
+            updated = 0
+            for file in pending[key]:
+                updated += db.execute(
+                    update(File).where(File.id == file.id).values(variants=variants)
+                ).rowcount
+            if not updated:
+                orphaned.append(variants)
+        for file_id, variants in done.items():
+            db.execute(update(File).where(File.id == file_id).values(variants=variants))
+        db.commit()
+
+        for variants in orphaned:
+            _discard_variants(variants)
+        _invalidate_tags(*{user_tag(file.user_id, "files") for file in files})
+        logger.info(f"Processed {len(results) + len(done)} of {len(file_ids)} files")
+        return len(results) + len(done)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error processing files {file_ids}: {e}")
+        raise
+    finally:
+        db.close()
+
+@celery_app.task(acks_late=True)
+def process_uploaded_file(file_id: int):
+    # Kept for messages published before uploads were batched
+    return process_uploaded_files([file_id])
+
+# Uploads arriving close together share one task, so identical content
+# across them is rendered once and the process pool is kept busy
+upload_batcher = TaskBatcher(process_uploaded_files, settings.IMAGE_BATCH_SIZE, settings.IMAGE_BATCH_WINDOW)
+
+@celery_app.task(acks_late=True)
+def process_avatar(profile_id: int):
+    storage = get_storage()
+    db = SessionLocal()
     try:
-        # Add email sending logic here
-        logger.info(f"Sending email to user {user_id}")
+        profile = db.query(Profile).filter(Profile.id == profile_id).first()
+        if not profile or not profile.avatar_url:
+            return False
+
+        avatar_url = profile.avatar_url
+        key = storage.key_from_url(avatar_url)
+        results = asyncio.run(process_images(storage, [key], get_image_pool()))
+        if key not in results:
+            return False
+
+        # Only record the variants if the avatar wasn't replaced meanwhile
+        updated = db.execute(
+            update(Profile).where(
+                Profile.id == profile_id,
+                Profile.avatar_url == avatar_url
+            ).values(avatar_variants=results[key])
+        ).rowcount
+        db.commit()
+
+        if not updated:
+            _discard_variants(results[key])
+            return False
+        _invalidate_tags(user_tag(profile.user_id, "profile"))
         return True
     except Exception as e:
-        logger.error(f"Error sending email to user {user_id}: {e}")
+        db.rollback()
+        logger.error(f"Error processing avatar for profile {profile_id}: {e}")
+        raise
+    finally:
+        db.close()
+
+def _retry_countdown(retries: int) -> float:
+    # Exponential backoff with jitter: ~10s, 20s, 40s ... capped at 10 minutes
+    return min(600, 10 * 2 ** retries) * random.uniform(0.5, 1.5)
+
+@celery_app.task(bind=True, acks_late=True, max_retries=settings.EMAIL_MAX_RETRIES)
+def send_email(self, email_to: str, subject: str, template_name: str, environment: Dict[str, Any]):
+    message = build_message(email_to, subject, template_name, environment)
+    try:
+        get_smtp_pool().send_message(message)
+        return True
+    except Exception as e:
+        if is_permanent_failure(e):
+            logger.error(f"Email to {email_to} rejected: {e}")
+            return False
+        logger.warning(f"Email to {email_to} failed, retrying: {e}")
+        raise self.retry(exc=e, countdown=_retry_countdown(self.request.retries))
+
+@celery_app.task(bind=True, acks_late=True, max_retries=settings.EMAIL_MAX_RETRIES)
+def send_email_batch(self, emails: List[Dict[str, Any]]):
+    # Each item holds send_email's arguments. The batch shares one SMTP
+    # session and only messages that failed transiently are retried.
+    messages = [build_message(**email) for email in emails]
+    errors = get_smtp_pool().send_messages(messages)
+
+    retry = []
+    for email, error in zip(emails, errors):
+        if error is None:
+            continue
+        if is_permanent_failure(error):
+            logger.error(f"Email to {email['email_to']} rejected: {error}")
+        else:
+            retry.append(email)
+    if retry:
+        logger.warning(f"Retrying {len(retry)} of {len(emails)} emails")
+        raise self.retry(args=[retry], countdown=_retry_countdown(self.request.retries))
+    return len(emails)
+
+@celery_app.task(acks_late=True)
+def send_email_notification(user_id: int, subject: str, message: str):
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+    finally:
+        db.close()
+    if not user:
+        logger.error(f"Error sending email to user {user_id}: user not found")
         return False
+
+    logger.info(f"Sending email to user {user_id}")
+    send_email.delay(
+        user.email,
+        subject,
+        "notification.html",
+        {"project_name": settings.PROJECT_NAME, "message": message}
+    )
+    return True
@@ -2,19 +2,27 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from ..database import Base, get_db
+from ..api import deps
 from ..core.config import settings
 from ..main import app
 import os
 
 # Use SQLite for testing
 SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test.db"
+SQLALCHEMY_ASYNC_TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 engine = create_engine(
     SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_TEST_DATABASE_URL)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 @pytest.fixture(scope="session")
 def db():
     Base.metadata.create_all(bind=engine)
@@ -28,10 +36,16 @@ def client(db):
             yield db
         finally:
             db.close()
+
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[deps.get_db] = override_get_async_db
     yield TestClient(app)
     del app.dependency_overrides[get_db]
+    del app.dependency_overrides[deps.get_db]
 
 @pytest.fixture
 def test_user(client):
@@ -0,0 +1,55 @@
+import asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.requests import Request
+from ..database import Base
+from ..models.blob import Blob  # noqa: F401  (mappers resolve relationships by name)
+from ..models.file import File  # noqa: F401
+from ..models.profile import Profile  # noqa: F401
+from ..models.user import User  # noqa: F401
+
+# Helpers shared by the endpoint and service tests
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100_000
+BOUNDARY = "testboundary"
+
+def run_with_db(test):
+    # Each test gets a fresh in-memory database shared by its sessions
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            return await test(async_sessionmaker(engine, expire_on_commit=False))
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+def multipart_body(content: bytes, filename: str = "image.png", field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\n'
+        f"hello\r\n"
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+def make_request(body: bytes, chunk_size: int = 4096) -> Request:
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def receive():
+        if chunks:
+            return {"type": "http.request", "body": chunks.pop(0), "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [
+            (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    }
+    return Request(scope, receive)
@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import select
+from ..models.blob import Blob
+from ..models.file import File
+from ..services.blob_store import BlobStore, blob_store
+from .fixtures import run_with_db
+
+SHA_A = "a" * 64
+SHA_B = "b" * 64
+
+async def add_file(db, blob: Blob, user_id: int = 1) -> File:
+    file = File(filename="a.png", file_url=f"memory://{blob.storage_key}", user_id=user_id, blob_id=blob.id)
+    db.add(file)
+    await db.commit()
+    return file
+
+def test_identical_content_shares_one_blob():
+    async def test(sessions):
+        async with sessions() as db:
+            first, created = await blob_store.acquire(db, SHA_A, "blobs/1.png", 10, "image/png")
+            assert created
+            await add_file(db, first)
+            second, created = await blob_store.acquire(db, SHA_A, "blobs/2.png", 10, "image/png")
+            assert not created
+            assert second.id == first.id
+            assert second.storage_key == "blobs/1.png"
+            assert second.ref_count == 2
+
+    run_with_db(test)
+
+def test_find_owned_requires_an_existing_reference():
+    async def test(sessions):
+        async with sessions() as db:
+            blob, _ = await blob_store.acquire(db, SHA_A, "blobs/1.png", 10, "image/png")
+            await add_file(db, blob, user_id=1)
+            assert (await blob_store.find_owned(db, SHA_A, 1)).id == blob.id
+            assert await blob_store.find_owned(db, SHA_A, 2) is None
+
+    run_with_db(test)
+
+def test_only_last_release_returns_the_key():
+    async def test(sessions):
+        async with sessions() as db:
+            blob, _ = await blob_store.acquire(db, SHA_A, "blobs/1.png", 10, "image/png")
+            await blob_store.acquire(db, SHA_A, "blobs/2.png", 10, "image/png")
+            await db.commit()
+            assert await blob_store.release(db, blob.id) is None
+            assert await blob_store.release(db, blob.id) == "blobs/1.png"
+            await db.commit()
+            assert (await db.execute(select(Blob))).scalars().all() == []
+
+    run_with_db(test)
+
+def test_release_many_keeps_shared_blobs():
+    async def test(sessions):
+        async with sessions() as db:
+            shared, _ = await blob_store.acquire(db, SHA_A, "blobs/a.png", 10, "image/png")
+            await blob_store.acquire(db, SHA_A, "blobs/a2.png", 10, "image/png")
+            single, _ = await blob_store.acquire(db, SHA_B, "blobs/b.png", 10, "image/png")
+            await db.commit()
+
+            assert await blob_store.release_many(db, {shared.id: 1, single.id: 1}) == ["blobs/b.png"]
+            assert await blob_store.release_many(db, {shared.id: 1}) == ["blobs/a.png"]
+            await db.commit()
+
+    run_with_db(test)
+
+def test_concurrent_insert_falls_back_to_increment(monkeypatch):
+    async def test(sessions):
+        async with sessions() as winner:
+            await blob_store.acquire(winner, SHA_A, "blobs/winner.png", 10, "image/png")
+            await winner.commit()
+
+        # The loser's first lookup ran before the winner committed
+        racing = BlobStore()
+        increment = racing._increment
+        calls = []
+
+        async def stale_increment(db, sha256):
+            calls.append(sha256)
+            return None if len(calls) == 1 else await increment(db, sha256)
+
+        monkeypatch.setattr(racing, "_increment", stale_increment)
+        async with sessions() as loser:
+            blob, created = await racing.acquire(loser, SHA_A, "blobs/loser.png", 10, "image/png")
+            await loser.commit()
+        assert not created
+        assert blob.storage_key == "blobs/winner.png"
+        assert blob.ref_count == 2
+        assert len(calls) == 2
+
+    run_with_db(test)
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import smtplib
+import socket
+from types import SimpleNamespace
+import pytest
+from aiosmtplib import SMTPServerDisconnected
+from ..core.config import settings
+from ..services.mail import build_message
+from ..services.smtp import SMTPConnectionPool, is_permanent_failure
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+class RecordingHandler:
+    # Local SMTP stand-in: records every message and the session it came on
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bounce@"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return "250 Message accepted"
+
+@pytest.fixture(autouse=True)
+def sender(monkeypatch):
+    monkeypatch.setattr(settings, "EMAILS_FROM_EMAIL", "noreply@example.com")
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = RecordingHandler()
+    controller = aiosmtpd.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+def make_pool(controller, **kwargs) -> SMTPConnectionPool:
+    return SMTPConnectionPool(controller.hostname, controller.port, use_tls=False, **kwargs)
+
+def message(email_to: str = "user@example.com"):
+    return build_message(
+        email_to,
+        "Welcome",
+        "verification.html",
+        {"project_name": "Test", "verification_url": "http://localhost/verify-email/abc"}
+    )
+
+def test_build_message_renders_template():
+    built = message()
+    html = built.get_body(("html",)).get_content()
+    assert "http://localhost/verify-email/abc" in html
+    assert built["To"] == "user@example.com"
+
+def test_pool_reuses_connection_across_messages(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller, size=1)
+    for _ in range(3):
+        pool.send_message(message())
+    pool.close()
+
+    assert len(handler.messages) == 3
+    assert len(handler.sessions) == 1
+
+def test_batch_reports_per_message_errors(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller)
+    errors = pool.send_messages([message(), message("bounce@example.com"), message()])
+    pool.close()
+
+    assert errors[0] is None and errors[2] is None
+    assert is_permanent_failure(errors[1])
+    assert len(handler.messages) == 2
+
+def test_pool_recycles_connections(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller, size=1, max_messages=2)
+    pool.send_messages([message() for _ in range(2)])
+    pool.send_message(message())
+    pool.close()
+
+    assert len(handler.sessions) == 2
+
+def test_pool_reconnects_after_server_drop(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller, size=1, idle_check=3600)
+    pool.send_message(message())
+    # Simulate the server timing out the idle session
+    pool._idle[0].client.sock.close()
+
+    errors = pool.send_messages([message(), message()])
+    pool.close()
+
+    assert errors == [None, None]
+    assert len(handler.messages) == 3
+
+def test_batch_does_not_resend_a_message_dropped_in_data(smtp_server, monkeypatch):
+    from ..services.smtp import _PooledSMTP, _TrackedSMTP
+    controller, handler = smtp_server
+    pool = make_pool(controller, size=1)
+    opened = []
+
+    class DropInData(_TrackedSMTP):
+        # The first session drops while sending the second message's body
+        def send(self, s):
+            if self.in_data and len(opened) == 1 and len(handler.messages) == 1:
+                self.close()
+                raise smtplib.SMTPServerDisconnected("connection lost")
+            return super().send(s)
+
+    def open_connection():
+        client = DropInData(controller.hostname, controller.port)
+        opened.append(client)
+        return _PooledSMTP(client)
+
+    monkeypatch.setattr(pool, "_open", open_connection)
+    errors = pool.send_messages([message(), message(), message()])
+    pool.close()
+
+    assert errors[0] is None and errors[2] is None
+    assert isinstance(errors[1], smtplib.SMTPServerDisconnected)
+    assert len(opened) == 2
+    assert len(handler.messages) == 2
+
+def test_batch_reports_login_failures(monkeypatch):
+    pool = SMTPConnectionPool("localhost", 25, use_tls=False, size=1)
+    failure = smtplib.SMTPAuthenticationError(535, b"bad credentials")
+
+    def open_connection():
+        raise failure
+
+    monkeypatch.setattr(pool, "_open", open_connection)
+    assert pool.send_messages([message(), message()]) == [failure, failure]
+
+def test_transient_failures_are_retried():
+    assert not is_permanent_failure(smtplib.SMTPServerDisconnected("gone"))
+    assert not is_permanent_failure(smtplib.SMTPResponseException(421, b"try later"))
+    assert is_permanent_failure(smtplib.SMTPResponseException(554, b"rejected"))
+
+def test_async_pool_reuses_and_replaces_dropped_connections(smtp_server):
+    from ..services.smtp import AsyncSMTPConnectionPool
+    controller, handler = smtp_server
+
+    async def run():
+        pool = AsyncSMTPConnectionPool(controller.hostname, controller.port, use_tls=False, size=1, idle_check=3600)
+        await pool.send_message(message())
+        await pool.send_message(message())
+        assert len(handler.sessions) == 1
+
+        # The server timed the idle session out
+        pool._idle[0].client.close()
+        await pool.send_message(message())
+        await pool.close()
+
+    asyncio.run(run())
+    assert len(handler.messages) == 3
+    assert len(handler.sessions) == 2
+
+def test_templates_are_compiled_once(monkeypatch):
+    from ..services.mail import preload_templates, render_template, templates
+    preload_templates()
+
+    # After preloading, rendering neither reloads sources nor checks mtimes
+    touched = []
+    monkeypatch.setattr(templates.loader, "get_source", lambda *args: touched.append(args))
+    monkeypatch.setattr(os.path, "getmtime", lambda path: touched.append(path))
+    render_template("verification.html", {"verification_url": "https://example.com", "project_name": "Test"})
+    render_template("verification.html", {"verification_url": "https://example.com", "project_name": "Test"})
+    assert touched == []
+
+def dropping_client(opened, drop_in_data):
+    from ..services.smtp import _TrackedAsyncSMTP
+
+    class DroppingClient(_TrackedAsyncSMTP):
+        # Never connects, so data() marks the transaction and then fails as
+        # a dropped session would; the first session drops before or in DATA
+        async def send_message(self, message):
+            opened.append(self)
+            if drop_in_data:
+                await self.data(b"message")
+            if len(opened) == 1:
+                raise SMTPServerDisconnected("connection lost")
+
+    return DroppingClient(hostname="localhost", port=25)
+
+@pytest.mark.parametrize("drop_in_data, attempts", [(False, 2), (True, 1)])
+def test_async_pool_only_resends_before_data(drop_in_data, attempts):
+    from ..services.smtp import AsyncSMTPConnectionPool, _PooledAsyncSMTP
+    pool = AsyncSMTPConnectionPool("localhost", 25, use_tls=False, size=1)
+    opened = []
+
+    async def open_connection():
+        return _PooledAsyncSMTP(dropping_client(opened, drop_in_data))
+
+    pool._open = open_connection
+
+    async def run():
+        if drop_in_data:
+            with pytest.raises(SMTPServerDisconnected):
+                await pool.send_message(message())
+        else:
+            await pool.send_message(message())
+
+    asyncio.run(run())
+    assert len(opened) == attempts
+
+@pytest.fixture
+def batched(monkeypatch):
+    from ..services import email
+    from ..tasks import worker
+    monkeypatch.setattr(settings, "EMAIL_DELIVERY", "celery")
+    monkeypatch.setattr(settings, "EMAIL_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "EMAIL_BATCH_WINDOW", 0.02)
+    monkeypatch.setattr(email, "_email_batcher", None)
+    broker = SimpleNamespace(up=True, enqueued=[])
+
+    async def enqueue(task, *args):
+        if broker.up:
+            broker.enqueued.append((task.name, *args))
+        return broker.up
+
+    monkeypatch.setattr(worker, "enqueue", enqueue)
+    return email, broker
+
+def test_emails_are_enqueued_in_batches(batched):
+    email, broker = batched
+    enqueued = broker.enqueued
+
+    async def run():
+        for i in range(4):
+            await email.send_verification_email(f"user{i}@example.com", "token")
+        # The full batch goes out at once, the remainder after the window
+        await asyncio.sleep(0)
+        assert len(enqueued) == 1
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert [name for name, _ in enqueued] == ["app.tasks.worker.send_email_batch"] * 2
+    assert [email["email_to"] for _, batch in enqueued for email in batch] == [
+        f"user{i}@example.com" for i in range(4)
+    ]
+
+def test_unqueued_emails_are_sent_inline(batched, monkeypatch):
+    email, broker = batched
+    broker.up = False
+    sent = []
+
+    async def send_message(message):
+        sent.append(message["To"])
+
+    monkeypatch.setattr(email.mail_pool, "send_message", send_message)
+
+    async def run():
+        await email.send_password_reset_email("user@example.com", "token")
+        await email.flush_email_queue()
+
+    asyncio.run(run())
+    assert sent == ["user@example.com"]
@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from ..api.v1.endpoints import files as files_endpoint
+from ..models.blob import Blob
+from ..models.file import File
+from ..schemas.file import BulkFileIds, UploadComplete
+from ..services.images import configured_variant_keys
+from ..storage.memory import InMemoryStorage
+from .fixtures import PNG, make_request, multipart_body, run_with_db
+
+USER = SimpleNamespace(id=1)
+
+@pytest.fixture
+def queued(monkeypatch):
+    # File ids handed to the image processing batcher
+    queued = []
+    monkeypatch.setattr(files_endpoint, "upload_batcher", SimpleNamespace(add=queued.append))
+    return queued
+
+@pytest.fixture
+def storage(monkeypatch, queued):
+    storage = InMemoryStorage()
+    monkeypatch.setattr(files_endpoint, "storage", storage)
+
+    async def invalidate_tags(*tags):
+        pass
+
+    monkeypatch.setattr(files_endpoint.cache, "invalidate_tags", invalidate_tags)
+    return storage
+
+def test_failed_commit_removes_uploaded_object(storage):
+    async def test(sessions):
+        async with sessions() as db:
+            async def commit():
+                raise RuntimeError("database went away")
+
+            db.commit = commit
+            with pytest.raises(RuntimeError):
+                await files_endpoint.upload_file(make_request(multipart_body(PNG)), db, USER)
+        assert storage.objects == {}
+
+    run_with_db(test)
+
+def test_duplicate_upload_keeps_one_object(storage, queued):
+    async def test(sessions):
+        async with sessions() as db:
+            first = await files_endpoint.upload_file(make_request(multipart_body(PNG)), db, USER)
+            second = await files_endpoint.upload_file(make_request(multipart_body(PNG)), db, USER)
+        assert queued == [first.id, second.id]
+        assert first.blob_id == second.blob_id
+        assert first.file_url == second.file_url
+        assert list(storage.objects) == [storage.key_from_url(first.file_url)]
+
+    run_with_db(test)
+
+async def add_variants(db, storage, file: File) -> None:
+    # What the image worker leaves behind for a file
+    key = storage.key_from_url(file.file_url)
+    file.variants = {}
+    for variant in configured_variant_keys(key):
+        storage.objects[variant] = b"variant"
+        file.variants[variant] = storage.url_for(variant)
+    await db.commit()
+
+def test_bulk_delete_keeps_variants_of_shared_blobs(storage):
+    async def test(sessions):
+        async with sessions() as db:
+            first = await files_endpoint.upload_file(make_request(multipart_body(PNG)), db, USER)
+            second = await files_endpoint.upload_file(make_request(multipart_body(PNG)), db, USER)
+            for file in (first, second):
+                await add_variants(db, storage, file)
+            blob_key = storage.key_from_url(first.file_url)
+
+            result = await files_endpoint.bulk_delete_files(BulkFileIds(ids=[first.id, 999]), db, USER)
+            assert [r["status"] for r in result["results"]] == ["deleted", "not_found"]
+            assert set(storage.objects) == {blob_key, *configured_variant_keys(blob_key)}
+
+            result = await files_endpoint.bulk_delete_files(BulkFileIds(ids=[second.id]), db, USER)
+            assert [r["status"] for r in result["results"]] == ["deleted"]
+            assert storage.objects == {}
+            assert (await db.execute(select(Blob))).scalars().all() == []
+
+    run_with_db(test)
+
+def test_bulk_delete_legacy_files_and_their_variants(storage):
+    async def test(sessions):
+        async with sessions() as db:
+            key = "uploads/legacy.png"
+            storage.objects[key] = PNG
+            legacy = File(filename="legacy.png", file_url=storage.url_for(key), user_id=USER.id)
+            db.add(legacy)
+            await db.commit()
+            await add_variants(db, storage, legacy)
+
+            result = await files_endpoint.bulk_delete_files(BulkFileIds(ids=[legacy.id]), db, USER)
+            assert [r["status"] for r in result["results"]] == ["deleted"]
+            assert storage.objects == {}
+            assert (await db.execute(select(File))).scalars().all() == []
+
+    run_with_db(test)
+
+def test_complete_routes_reject_backends_without_presigning(storage, monkeypatch):
+    from ..api.v1.endpoints import profiles as profiles_endpoint
+    monkeypatch.setattr(profiles_endpoint, "storage", storage)
+
+    for complete, key in (
+        (files_endpoint.complete_upload, f"uploads/{USER.id}/a.png"),
+        (profiles_endpoint.complete_avatar, f"avatars/{USER.id}/a.png"),
+    ):
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(complete(UploadComplete(key=key, filename="a.png"), None, USER))
+        assert exc.value.status_code == 400
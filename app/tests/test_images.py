@@ -0,0 +1,56 @@
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from ..services.images import process_images, render_variants, variant_key
+from ..storage.memory import InMemoryStorage
+
+def make_jpeg(size=(3000, 2000), orientation: int = None) -> bytes:
+    image = Image.new("RGB", size, (200, 30, 30))
+    exif = Image.Exif()
+    exif[0x010F] = "TestCam"  # Make
+    if orientation:
+        exif[0x0112] = orientation
+    out = io.BytesIO()
+    image.save(out, "JPEG", exif=exif.tobytes(), quality=95)
+    return out.getvalue()
+
+def test_render_variants_resizes_and_strips_exif():
+    variants = render_variants(make_jpeg(), sizes={"thumbnail": 256, "medium": 1024}, formats=["webp", "jpeg"])
+
+    assert set(variants) == {"thumbnail.webp", "thumbnail.jpeg", "medium.webp", "medium.jpeg"}
+    thumbnail = Image.open(io.BytesIO(variants["thumbnail.jpeg"][0]))
+    assert thumbnail.size == (256, 171)
+    assert not thumbnail.getexif()
+    assert variants["medium.webp"][1] == "image/webp"
+    assert len(variants["thumbnail.webp"][0]) < 20_000
+
+def test_render_variants_applies_orientation():
+    # Orientation 6 means "rotate 90 degrees clockwise to display"
+    variants = render_variants(make_jpeg(orientation=6), sizes={"thumbnail": 256}, formats=["jpeg"])
+    thumbnail = Image.open(io.BytesIO(variants["thumbnail.jpeg"][0]))
+    assert thumbnail.size == (171, 256)
+
+def test_render_variants_never_upscales_and_flattens_alpha():
+    image = Image.new("RGBA", (100, 50), (0, 0, 0, 0))
+    out = io.BytesIO()
+    image.save(out, "PNG")
+
+    variants = render_variants(out.getvalue(), sizes={"thumbnail": 256}, formats=["jpeg", "webp"])
+    jpeg = Image.open(io.BytesIO(variants["thumbnail.jpeg"][0]))
+    assert jpeg.size == (100, 50)
+    assert jpeg.getpixel((0, 0)) == (255, 255, 255)
+    assert Image.open(io.BytesIO(variants["thumbnail.webp"][0])).mode == "RGBA"
+
+def test_process_images_stores_variants_next_to_original():
+    storage = InMemoryStorage()
+    storage.objects["blobs/a.jpg"] = make_jpeg((800, 600))
+    storage.objects["blobs/broken.jpg"] = b"not an image"
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        results = asyncio.run(process_images(storage, ["blobs/a.jpg", "blobs/broken.jpg"], pool))
+
+    assert list(results) == ["blobs/a.jpg"]
+    assert results["blobs/a.jpg"]["thumbnail.webp"] == storage.url_for("blobs/a/thumbnail.webp")
+    assert variant_key("blobs/a.jpg", "medium.jpeg") in storage.objects
+    assert storage.content_types["blobs/a/thumbnail.webp"] == "image/webp"
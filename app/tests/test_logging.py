@@ -0,0 +1,78 @@
+import json
+import logging
+import queue
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from ..core.config import settings
+from ..middleware import logging as access_log
+from ..middleware.logging import DroppingQueueHandler, JsonFormatter, new_request_id, request_id_var, should_log
+from ..middleware.observability import ObservabilityMiddleware
+
+@pytest.fixture
+def records(monkeypatch):
+    # Captures what would be handed to the writer thread
+    captured = queue.Queue()
+    handler = DroppingQueueHandler(captured)
+    monkeypatch.setattr(access_log.access_logger, "handlers", [handler])
+
+    def drain():
+        items = []
+        while not captured.empty():
+            items.append(json.loads(JsonFormatter().format(captured.get_nowait())))
+        return items
+
+    return drain
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(ObservabilityMiddleware)
+
+    @app.get("/logging-test/ok")
+    async def ok():
+        return {"request_id": request_id_var.get()}
+
+    return TestClient(app)
+
+def test_should_log_samples_only_successes(monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_LOG_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(settings, "ACCESS_LOG_SLOW_REQUEST_SECONDS", 1.0)
+    assert not should_log(200, 0.01)
+    assert should_log(404, 0.01)
+    assert should_log(500, 0.01)
+    assert should_log(200, 2.0)
+
+def test_request_id_validation():
+    assert new_request_id("abc-123") == "abc-123"
+    generated = new_request_id("bad id\nwith newline")
+    assert generated != "bad id\nwith newline" and len(generated) == 32
+    assert new_request_id(None) != new_request_id(None)
+
+def test_access_log_is_structured_json(client, records):
+    response = client.get("/logging-test/ok", headers={"X-Request-ID": "req-42"})
+
+    assert response.headers["X-Request-ID"] == "req-42"
+    assert response.json() == {"request_id": "req-42"}
+    [record] = records()
+    assert record["message"] == "request"
+    assert record["request_id"] == "req-42"
+    assert record["method"] == "GET"
+    assert record["path"] == "/logging-test/ok"
+    assert record["status"] == 200
+    assert record["duration_ms"] >= 0
+
+def test_sampled_out_requests_still_get_an_id(client, records, monkeypatch):
+    monkeypatch.setattr(settings, "ACCESS_LOG_SAMPLE_RATE", 0.0)
+    response = client.get("/logging-test/ok")
+    assert len(response.headers["X-Request-ID"]) == 32
+    assert records() == []
+    client.get("/logging-test/unknown")
+    assert [r["status"] for r in records()] == [404]
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord("app.access", logging.INFO, __file__, 0, "request", None, None)
+    handler.emit(record)
+    handler.emit(record)
+    assert handler.dropped == 1
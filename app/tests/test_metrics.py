@@ -0,0 +1,77 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from fastapi.responses import StreamingResponse
+from ..core.config import settings
+from ..middleware.observability import ObservabilityMiddleware
+from ..monitoring import prometheus
+from ..monitoring.prometheus import LabelGuard, OTHER_ENDPOINT, UNMATCHED_ENDPOINT
+
+def request_count(method: str, endpoint: str, status: int) -> float:
+    value = REGISTRY.get_sample_value(
+        "http_request_count_total",
+        {"method": method, "endpoint": endpoint, "status": str(status)}
+    )
+    return value or 0.0
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(prometheus, "endpoint_guard", LabelGuard(10))
+    app = FastAPI()
+    app.add_middleware(ObservabilityMiddleware)
+
+    @app.get("/metrics-test/items/{item_id}")
+    async def read_item(item_id: int):
+        return {"id": item_id}
+
+    @app.get("/metrics-test/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"chunk-{i};".encode()
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/metrics-test/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    return TestClient(app)
+
+def test_labels_by_route_template(client):
+    before = request_count("GET", "/metrics-test/items/{item_id}", 200)
+    for item_id in range(3):
+        assert client.get(f"/metrics-test/items/{item_id}").status_code == 200
+    assert request_count("GET", "/metrics-test/items/{item_id}", 200) == before + 3
+    assert request_count("GET", "/metrics-test/items/1", 200) == 0
+
+def test_unmatched_paths_share_one_series(client):
+    before = request_count("GET", UNMATCHED_ENDPOINT, 404)
+    client.get("/metrics-test/nope/1")
+    client.get("/metrics-test/nope/2")
+    assert request_count("GET", UNMATCHED_ENDPOINT, 404) == before + 2
+
+def test_unknown_methods_are_folded(client):
+    before = request_count("OTHER", "/metrics-test/items/{item_id}", 405)
+    client.request("PROPFIND", "/metrics-test/items/1")
+    assert request_count("OTHER", "/metrics-test/items/{item_id}", 405) == before + 1
+
+def test_label_guard_caps_distinct_values():
+    guard = LabelGuard(2)
+    assert [guard.label(v) for v in ("/a", "/b", "/c", "/a")] == ["/a", "/b", OTHER_ENDPOINT, "/a"]
+
+def test_version_header_added(client):
+    response = client.get("/metrics-test/items/1")
+    assert response.headers["X-API-Version"] == settings.VERSION
+
+def test_streaming_response_passes_through(client):
+    with client.stream("GET", "/metrics-test/stream") as response:
+        assert response.headers["X-API-Version"] == settings.VERSION
+        assert b"".join(response.iter_bytes()) == b"chunk-0;chunk-1;chunk-2;"
+    assert request_count("GET", "/metrics-test/stream", 200) >= 1
+
+def test_unhandled_errors_recorded_as_500(client):
+    before = request_count("GET", "/metrics-test/boom", 500)
+    with pytest.raises(RuntimeError):
+        client.get("/metrics-test/boom")
+    assert request_count("GET", "/metrics-test/boom", 500) == before + 1
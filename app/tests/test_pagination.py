@@ -0,0 +1,14 @@
+from datetime import datetime, timezone
+import pytest
+from ..utils.pagination import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "W10", "WyJ4IiwxXQ"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+
+moto = pytest.importorskip("moto")
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1024
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        from ..services.s3 import S3Service
+        service = S3Service()
+        service.bucket = "test-bucket"
+        service.s3_client.create_bucket(Bucket=service.bucket)
+        yield service
+
+def test_presign_upload_policy(s3):
+    presigned = asyncio.run(s3.presign_upload("uploads/1/a.png", "image/png", 1024))
+    assert presigned["fields"]["key"] == "uploads/1/a.png"
+    assert presigned["fields"]["Content-Type"] == "image/png"
+    assert "policy" in presigned["fields"]
+
+def test_verify_upload_sniffs_and_sizes(s3):
+    s3.s3_client.put_object(Bucket=s3.bucket, Key="uploads/1/a.png", Body=PNG)
+    size, content_type = asyncio.run(
+        s3.verify_upload("uploads/1/a.png", ["image/png"], 10_000)
+    )
+    assert (size, content_type) == (len(PNG), "image/png")
+
+@pytest.mark.parametrize("body, max_size", [(PNG, 100), (b"not an image", 10_000)])
+def test_verify_upload_rejects(s3, body, max_size):
+    s3.s3_client.put_object(Bucket=s3.bucket, Key="uploads/1/bad.png", Body=body)
+    with pytest.raises(ValueError):
+        asyncio.run(s3.verify_upload("uploads/1/bad.png", ["image/png"], max_size))
+
+def test_verify_upload_missing_object(s3):
+    with pytest.raises(ValueError):
+        asyncio.run(s3.verify_upload("uploads/1/missing.png", ["image/png"], 10_000))
+
+def test_presign_download(s3):
+    url = asyncio.run(s3.presign_download("uploads/1/a.png", "a.png"))
+    assert "uploads/1/a.png" in url
+    assert "Signature" in url or "X-Amz-Signature" in url
@@ -0,0 +1,59 @@
+import asyncio
+import time
+import pytest
+from ..cache import principal_cache as principal_cache_module
+from ..cache.principal_cache import PrincipalCache
+from ..schemas.user import UserPrincipal
+from ..models.enums import UserRole
+
+fakeredis = pytest.importorskip("fakeredis")
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(principal_cache_module, "redis_client", fakeredis.aioredis.FakeRedis())
+    return PrincipalCache(max_size=2, local_ttl=30, ttl=300)
+
+def make_principal(user_id: int, username: str) -> UserPrincipal:
+    return UserPrincipal(
+        id=user_id,
+        username=username,
+        email=f"{username}@example.com",
+        role=UserRole.USER,
+        is_active=True,
+        is_verified=True
+    )
+
+def test_set_and_get(cache):
+    principal = make_principal(1, "alice")
+
+    async def run():
+        await cache.set("alice", principal, time.time() + 60)
+        assert await cache.get("alice") == principal
+        # Drop the local tier to force a Redis read
+        cache._local.clear()
+        assert await cache.get("alice") == principal
+
+    asyncio.run(run())
+
+def test_expired_token_is_not_cached(cache):
+    async def run():
+        await cache.set("bob", make_principal(2, "bob"), time.time() - 1)
+        assert await cache.get("bob") is None
+
+    asyncio.run(run())
+
+def test_invalidate(cache):
+    async def run():
+        await cache.set("carol", make_principal(3, "carol"))
+        await cache.invalidate("carol")
+        assert await cache.get("carol") is None
+
+    asyncio.run(run())
+
+def test_local_tier_is_bounded(cache):
+    async def run():
+        for i, name in enumerate(["a", "b", "c"]):
+            await cache.set(name, make_principal(i, name))
+        assert list(cache._local) == ["b", "c"]
+
+    asyncio.run(run())
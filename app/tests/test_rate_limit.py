@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from ..core.rate_limit import RateLimitResult, RateLimiter, TokenBucket, rate_limit_headers
+
+fakeredis = pytest.importorskip("fakeredis")
+
+def test_token_bucket_rejects_after_capacity():
+    bucket = TokenBucket(capacity=3, rate=0.001)
+    assert [bucket.consume() for _ in range(4)] == [True, True, True, False]
+    assert bucket.time_until_token() > 0
+
+def test_sliding_window_limit_is_shared_between_pods():
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+    pods = [RateLimiter(fakeredis.aioredis.FakeRedis(server=server)) for _ in range(2)]
+
+    async def run():
+        return [await pods[i % 2].hit("rate_limit:test", 3, 60) for i in range(4)]
+
+    results = asyncio.run(run())
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    assert 0 < results[3].reset_after <= 60
+
+def test_local_bucket_short_circuits_redis():
+    class FailingRedis:
+        def register_script(self, script):
+            async def call(**kwargs):
+                raise AssertionError("Redis should not be called")
+            return call
+
+    limiter = RateLimiter(FailingRedis())
+    limiter._local_bucket("rate_limit:flood", 1, 60).consume()
+
+    result = asyncio.run(limiter.hit("rate_limit:flood", 1, 60))
+    assert not result.allowed
+
+def test_headers_include_retry_after_when_limited():
+    pytest.importorskip("lupa")
+    limiter = RateLimiter(fakeredis.aioredis.FakeRedis())
+
+    async def run():
+        await limiter.hit("rate_limit:headers", 1, 30)
+        return await limiter.hit("rate_limit:headers", 1, 30)
+
+    headers = rate_limit_headers(asyncio.run(run()))
+    assert headers["X-RateLimit-Limit"] == "1"
+    assert headers["X-RateLimit-Remaining"] == "0"
+    assert "Retry-After" in headers
+
+def test_rejected_hits_do_not_spend_local_tokens():
+    class RejectingRedis:
+        def register_script(self, script):
+            async def call(**kwargs):
+                return [0, 0, 1000]
+            return call
+
+    limiter = RateLimiter(RejectingRedis())
+
+    async def run():
+        return [await limiter.hit("rate_limit:busy", 2, 60) for _ in range(3)]
+
+    assert [r.allowed for r in asyncio.run(run())] == [False, False, False]
+    assert limiter._buckets["rate_limit:busy"].tokens > 1
+
+def test_spoofed_forwarded_for_does_not_change_identity(monkeypatch):
+    from starlette.requests import Request
+    from starlette.responses import Response
+    from datetime import timedelta
+    from ..api import deps
+
+    keys = []
+
+    class RecordingLimiter:
+        async def hit(self, key, calls, period):
+            keys.append(key)
+            return RateLimitResult(True, calls, calls, period)
+
+    monkeypatch.setattr(deps, "rate_limiter", RecordingLimiter())
+    dependency = deps.rate_limit(5, timedelta(minutes=1), per_ip=True)
+
+    for spoofed in ("1.1.1.1", "2.2.2.2, 10.0.0.1"):
+        request = Request({
+            "type": "http",
+            "method": "POST",
+            "path": "/auth/login",
+            "headers": [(b"x-forwarded-for", spoofed.encode()), (b"x-real-ip", b"203.0.113.7")],
+            "client": ("10.0.0.2", 5000),
+        })
+        asyncio.run(dependency(request, Response()))
+
+    assert keys == ["rate_limit:ip:203.0.113.7:/auth/login"] * 2
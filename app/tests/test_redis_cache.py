@@ -0,0 +1,267 @@
+import asyncio
+import pytest
+from ..cache.redis_cache import RedisCache
+from ..cache.serializers import get_serializer
+
+fakeredis = pytest.importorskip("fakeredis")
+
+@pytest.fixture(params=["json", "msgpack"])
+def cache(request):
+    if request.param == "msgpack":
+        pytest.importorskip("msgpack")
+    return RedisCache(fakeredis.aioredis.FakeRedis(), serializer=get_serializer(request.param))
+
+def test_get_set_delete(cache):
+    async def run():
+        assert await cache.set("key", {"a": 1, "b": [1, 2]})
+        assert await cache.get("key") == {"a": 1, "b": [1, 2]}
+        assert await cache.delete("key")
+        assert await cache.get("key") is None
+
+    asyncio.run(run())
+
+def test_get_many_and_set_many(cache):
+    async def run():
+        assert await cache.set_many({"k1": 1, "k2": "two"}, ttl=60)
+        assert await cache.get_many(["k1", "k2", "missing"]) == {"k1": 1, "k2": "two"}
+        assert await cache.get_many([]) == {}
+
+    asyncio.run(run())
+
+def test_unknown_serializer():
+    with pytest.raises(ValueError):
+        get_serializer("pickle")
+
+@pytest.fixture
+def shared_cache(monkeypatch):
+    from ..cache import redis_cache
+    fake = RedisCache(fakeredis.aioredis.FakeRedis())
+    monkeypatch.setattr(redis_cache, "cache", fake)
+    return fake
+
+def test_cached_uses_explicit_key_builder(shared_cache):
+    from ..cache.redis_cache import cached, key_by_user
+
+    calls = []
+
+    class Principal:
+        def __init__(self, id):
+            self.id = id
+
+    @cached(ttl=60, key_builder=key_by_user)
+    async def handler(current_user, db):
+        calls.append(current_user.id)
+        return {"user": current_user.id}
+
+    async def run():
+        # A fresh "db" object per call must not change the key
+        assert await handler(current_user=Principal(1), db=object()) == {"user": 1}
+        assert await handler(current_user=Principal(1), db=object()) == {"user": 1}
+        assert await handler(current_user=Principal(2), db=object()) == {"user": 2}
+
+    asyncio.run(run())
+    assert calls == [1, 2]
+
+def test_cached_single_flight(shared_cache):
+    from ..cache.redis_cache import cached
+
+    calls = []
+
+    @cached(ttl=60)
+    async def slow(item_id: int):
+        calls.append(item_id)
+        await asyncio.sleep(0.05)
+        return item_id * 2
+
+    async def run():
+        return await asyncio.gather(*(slow(item_id=7) for _ in range(10)))
+
+    assert asyncio.run(run()) == [14] * 10
+    assert calls == [7]
+
+def test_cached_serves_stale_while_revalidating(shared_cache):
+    from ..cache.redis_cache import cached
+
+    @cached(ttl=60, stale_ttl=60, beta=0)
+    async def value():
+        return "fresh"
+
+    async def run():
+        await value()
+        key = [k async for k in shared_cache.redis_client.scan_iter("cache:*")][0].decode()
+        entry = await shared_cache.get(key)
+        entry["value"] = "stale"
+        entry["expires"] = 0
+        await shared_cache.set(key, entry, 60)
+        # Another caller is already refreshing this key
+        await shared_cache.redis_client.set(f"lock:{key}", b"1")
+        return await value()
+
+    assert asyncio.run(run()) == "stale"
+
+def test_cached_refreshes_stale_entries_in_background(shared_cache):
+    from ..cache.redis_cache import cached
+
+    calls = []
+
+    @cached(ttl=60, stale_ttl=60, beta=0)
+    async def value():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return f"fresh-{len(calls)}"
+
+    async def run():
+        await value()
+        key = [k async for k in shared_cache.redis_client.scan_iter("cache:*")][0].decode()
+        entry = await shared_cache.get(key)
+        entry["expires"] = 0
+        await shared_cache.set(key, entry, 60)
+        # Answered from the stale entry without waiting for the recompute
+        served = await asyncio.gather(*(value() for _ in range(5)))
+        assert served == ["fresh-1"] * 5
+        for _ in range(50):
+            if await value() == "fresh-2":
+                break
+            await asyncio.sleep(0.01)
+        assert await value() == "fresh-2"
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+def test_lock_is_released_only_by_its_holder(shared_cache):
+    from ..cache.redis_cache import _acquire_lock, _release_lock
+
+    async def run():
+        token = await _acquire_lock("lock:k")
+        assert token is not None
+        assert await _acquire_lock("lock:k") is None
+        # Our lock expired and another caller took it over
+        await shared_cache.redis_client.set("lock:k", b"other")
+        await _release_lock("lock:k", token)
+        assert await shared_cache.redis_client.get("lock:k") == b"other"
+        await shared_cache.redis_client.set("lock:k", token)
+        await _release_lock("lock:k", token)
+        assert await shared_cache.redis_client.get("lock:k") is None
+
+    asyncio.run(run())
+
+def test_followers_take_over_from_a_cancelled_leader(shared_cache):
+    from ..cache.redis_cache import cached
+
+    calls = []
+
+    @cached(ttl=60)
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def run():
+        leader = asyncio.create_task(slow())
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(slow()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await asyncio.gather(*followers) == ["value"] * 3
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+def test_cached_pydantic_response_model(shared_cache):
+    from datetime import datetime
+    from ..cache.redis_cache import cached
+    from ..schemas.profile import ProfileInDB
+
+    class Row:
+        id = 1
+        user_id = 1
+        full_name = "Ada"
+        bio = None
+        phone_number = None
+        address = None
+        avatar_url = None
+        created_at = datetime(2024, 1, 1)
+        updated_at = None
+
+    @cached(ttl=60, response_model=ProfileInDB)
+    async def get_profile(user_id: int):
+        return Row()
+
+    async def run():
+        first = await get_profile(user_id=1)
+        second = await get_profile(user_id=1)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert isinstance(second, ProfileInDB)
+    assert first == second
+
+def test_cached_tag_invalidation(shared_cache):
+    from ..cache.redis_cache import cached, key_by_user, tags_by_user, user_tag
+
+    calls = []
+
+    class Principal:
+        id = 5
+
+    @cached(ttl=60, key_builder=key_by_user, tags=tags_by_user("profile"))
+    async def get_profile(current_user):
+        calls.append(current_user.id)
+        return {"calls": len(calls)}
+
+    async def run():
+        assert await get_profile(current_user=Principal()) == {"calls": 1}
+        assert await get_profile(current_user=Principal()) == {"calls": 1}
+        await shared_cache.invalidate_tags(user_tag(5, "profile"))
+        assert await get_profile(current_user=Principal()) == {"calls": 2}
+        # Unrelated tags leave the entry alone
+        await shared_cache.invalidate_tags(user_tag(5, "files"))
+        assert await get_profile(current_user=Principal()) == {"calls": 2}
+
+    asyncio.run(run())
+
+def test_local_cache_byte_budget():
+    from ..cache.local_cache import LocalCache
+
+    local = LocalCache(max_entries=100, max_bytes=15, ttl=30)
+    local.set("a", b"123456789")
+    local.set("b", b"123456789")
+    assert local.get("a") is None
+    assert local.get("b") == b"123456789"
+    assert local.size_bytes == 10
+
+def test_l1_invalidated_across_pods():
+    from ..cache.invalidation import InvalidationBus
+    from ..cache.local_cache import LocalCache
+
+    server = fakeredis.FakeServer()
+
+    def make_pod():
+        redis = fakeredis.aioredis.FakeRedis(server=server)
+        bus = InvalidationBus(redis, "cache:invalidate:test")
+        local = LocalCache(max_entries=100, max_bytes=1024, ttl=30)
+        return RedisCache(redis, local=local, bus=bus), bus
+
+    async def run():
+        (pod_a, bus_a), (pod_b, bus_b) = make_pod(), make_pod()
+        await bus_a.start()
+        await bus_b.start()
+        await asyncio.sleep(0.05)
+        try:
+            await pod_a.set("shared", "v1")
+            assert await pod_b.get("shared") == "v1"
+            assert pod_b.local.get("shared") is not None
+
+            await pod_a.set("shared", "v2")
+            for _ in range(50):
+                if pod_b.local.get("shared") is None:
+                    break
+                await asyncio.sleep(0.01)
+            assert await pod_b.get("shared") == "v2"
+        finally:
+            await bus_a.stop()
+            await bus_b.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+from ..core import security
+from ..core.config import settings
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    # One running hash and no queue: a second concurrent hash is shed
+    monkeypatch.setattr(settings, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_QUEUE_SIZE", 0)
+    release = threading.Event()
+    yield release
+    release.set()
+
+def test_sheds_load_when_pool_is_full(one_slot):
+    async def run():
+        busy = asyncio.create_task(security._run_in_hash_pool(one_slot.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as exc:
+            await security.get_password_hash_async("secret")
+        assert exc.value.status_code == 503
+        assert exc.value.headers["Retry-After"] == "1"
+        one_slot.set()
+        assert await busy is True
+
+    asyncio.run(run())
+    assert security._pending_hashes == 0
+
+def test_cancelled_caller_keeps_slot_until_job_ends(one_slot):
+    async def run():
+        busy = asyncio.create_task(security._run_in_hash_pool(one_slot.wait, 5))
+        await asyncio.sleep(0.05)
+        busy.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await busy
+        # The bcrypt job is still running, so the slot is still taken
+        assert security._pending_hashes == 1
+        with pytest.raises(HTTPException):
+            await security.get_password_hash_async("secret")
+
+        one_slot.set()
+        for _ in range(100):
+            if security._pending_hashes == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert security._pending_hashes == 0
+
+    asyncio.run(run())
+
+def test_outdated_hash_is_upgraded_on_login():
+    old_hash = bcrypt.using(rounds=4).hash("secret")
+    verified, new_hash = asyncio.run(security.verify_and_update_password("secret", old_hash))
+    assert verified
+    assert new_hash.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+    assert security.verify_password("secret", new_hash)
+
+def test_current_hash_is_left_alone():
+    current = security.get_password_hash("secret")
+    assert asyncio.run(security.verify_and_update_password("secret", current)) == (True, None)
+    assert asyncio.run(security.verify_and_update_password("wrong", current)) == (False, None)
+
+def test_login_stores_upgraded_hash():
+    from starlette.responses import Response
+    from ..api.v1.endpoints import auth
+    from ..models.user import User
+    from ..schemas.user import UserLogin
+    from .fixtures import run_with_db
+
+    async def test(sessions):
+        async with sessions() as db:
+            db.add(User(username="alice", email="a@example.com", hashed_password=bcrypt.using(rounds=4).hash("secret")))
+            await db.commit()
+            await auth.login(Response(), UserLogin(username="alice", password="secret"), db)
+        async with sessions() as db:
+            user = await db.get(User, 1)
+        return user.hashed_password
+
+    assert run_with_db(test).startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from ..storage.local import LocalStorage
+from ..storage.base import content_disposition
+from ..storage.memory import InMemoryStorage
+
+DATA = bytes(range(256)) * 1024
+
+async def chunked(data: bytes, size: int = 10_000):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+async def read_all(storage, key: str) -> bytes:
+    return b"".join([chunk async for chunk in storage.open(key)])
+
+@pytest.fixture(params=["local", "memory"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(str(tmp_path), "/static/uploads")
+    return InMemoryStorage()
+
+def test_save_open_delete(storage):
+    async def run():
+        key = storage.build_key("uploads", "data.bin")
+        url = await storage.save_stream(chunked(DATA), key, "application/octet-stream")
+        assert storage.key_from_url(url) == key
+        assert await read_all(storage, key) == DATA
+        assert await storage.delete(key)
+        assert not await storage.delete(key)
+
+    asyncio.run(run())
+
+def test_local_storage_rejects_path_traversal(tmp_path):
+    storage = LocalStorage(str(tmp_path / "root"), "/static/uploads")
+    with pytest.raises(ValueError):
+        asyncio.run(storage.save_stream(chunked(b"x"), "../escape.txt", "text/plain"))
+
+def test_local_download_supports_range(tmp_path):
+    storage = LocalStorage(str(tmp_path), "/static/uploads")
+    asyncio.run(storage.save_stream(chunked(DATA), "uploads/data.bin", "application/octet-stream"))
+
+    app = FastAPI()
+
+    @app.get("/download")
+    async def download():
+        return await storage.download_response("uploads/data.bin", "data.bin", "application/octet-stream")
+
+    response = TestClient(app).get("/download", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == DATA[10:20]
+
+def test_content_disposition_escapes_filename():
+    header = content_disposition('evil".png\r\nSet-Cookie: x=1')
+    assert "\r" not in header and "\n" not in header
+    assert header.startswith('attachment; filename="evil_.png__Set-Cookie: x=1"; ')
+    assert header.endswith("filename*=UTF-8''evil%22.png%0D%0ASet-Cookie%3A%20x%3D1")
+    assert content_disposition("résumé.pdf").endswith("filename*=UTF-8''r%C3%A9sum%C3%A9.pdf")
+
+def test_memory_download_quotes_filename():
+    storage = InMemoryStorage()
+    storage.objects["k"] = b"x"
+    response = asyncio.run(storage.download_response("k", 'a"b.txt', "text/plain"))
+    assert response.headers["Content-Disposition"] == content_disposition('a"b.txt')
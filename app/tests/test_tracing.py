@@ -0,0 +1,135 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from ..core.config import settings
+from ..middleware.observability import ObservabilityMiddleware
+from ..monitoring import tracing
+
+pytest.importorskip("opentelemetry.sdk")
+fakeredis = pytest.importorskip("fakeredis")
+from opentelemetry import propagate, trace
+
+@pytest.fixture(scope="module")
+def exporter():
+    # The global provider can only be installed once per process
+    patch = pytest.MonkeyPatch()
+    patch.setattr(settings, "TRACING_ENABLED", True)
+    patch.setattr(settings, "TRACING_EXPORTER", "memory")
+    patch.setattr(settings, "TRACING_SAMPLE_RATIO", 1.0)
+    if tracing.memory_exporter is None:
+        tracing.setup_tracing("tests")
+    yield tracing.memory_exporter
+    patch.undo()
+
+@pytest.fixture
+def spans(exporter):
+    exporter.clear()
+    return exporter.get_finished_spans
+
+def test_instrumentation_is_a_noop_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "TRACING_ENABLED", False)
+    client = fakeredis.aioredis.FakeRedis()
+    execute_command = client.execute_command
+    tracing.instrument_redis(client)
+    assert client.execute_command == execute_command
+    with tracing.server_span({"method": "GET", "path": "/", "headers": []}) as span:
+        assert span is None
+
+def test_engine_spans_nest_under_current_span(spans):
+    engine = create_engine("sqlite://")
+    tracing.instrument_engine(engine)
+
+    with tracing.get_tracer().start_as_current_span("parent") as parent:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    query = next(span for span in spans() if span.name == "SELECT")
+    assert query.attributes["db.system"] == "sqlite"
+    assert query.attributes["db.statement"] == "SELECT 1"
+    assert query.parent.span_id == parent.get_span_context().span_id
+
+def test_redis_commands_and_pipelines(spans):
+    client = fakeredis.aioredis.FakeRedis()
+    tracing.instrument_redis(client)
+
+    async def run():
+        await client.set("k", "v")
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.get("k")
+            pipe.incr("n")
+            return await pipe.execute()
+
+    assert asyncio.run(run()) == [b"v", 1]
+    names = [span.name for span in spans()]
+    assert "SET" in names
+    pipeline = next(span for span in spans() if span.name == "PIPELINE")
+    assert pipeline.attributes["db.redis.commands"] == 2
+
+def test_sync_redis_client(spans):
+    client = fakeredis.FakeRedis()
+    tracing.instrument_redis(client)
+    client.set("k", "v")
+    pipe = client.pipeline(transaction=False)
+    pipe.incr("n")
+    assert pipe.execute() == [1]
+    assert {span.name for span in spans()} >= {"SET", "PIPELINE"}
+
+def test_s3_calls(spans, monkeypatch):
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        from ..services.s3 import S3Service
+        service = S3Service()
+        service.bucket = "test-bucket"
+        service.s3_client.create_bucket(Bucket=service.bucket)
+        assert asyncio.run(service.delete_key("missing.bin"))
+
+    call = next(span for span in spans() if span.name == "s3.DeleteObject")
+    assert call.attributes["aws.s3.bucket"] == "test-bucket"
+    assert call.attributes["http.status_code"] == 204
+
+def test_celery_task_continues_publisher_trace(spans):
+    from celery import signals
+    tracing.instrument_celery()
+
+    headers = {}
+    with tracing.get_tracer().start_as_current_span("publish") as publisher:
+        signals.before_task_publish.send(sender="app.tasks.worker.send_email", headers=headers)
+    assert "traceparent" in headers
+
+    # Custom headers surface as attributes of the task's request
+    class Task:
+        name = "app.tasks.worker.send_email"
+        request = SimpleNamespace(retries=0, **headers)
+
+    task = Task()
+    signals.task_prerun.send(sender=task, task_id="task-1", task=task)
+    assert trace.get_current_span().get_span_context().trace_id == publisher.get_span_context().trace_id
+    signals.task_postrun.send(sender=task, task_id="task-1", task=task, state="SUCCESS")
+
+    consumer = next(span for span in spans() if span.name == "app.tasks.worker.send_email")
+    assert consumer.parent.span_id == publisher.get_span_context().span_id
+    assert consumer.attributes["celery.state"] == "SUCCESS"
+    assert not trace.get_current_span().get_span_context().is_valid
+
+def test_http_server_span_uses_route_and_incoming_context(spans):
+    app = FastAPI()
+    app.add_middleware(ObservabilityMiddleware)
+
+    @app.get("/tracing-test/items/{item_id}")
+    async def read_item(item_id: int):
+        return {"trace_id": trace.get_current_span().get_span_context().trace_id}
+
+    carrier = {}
+    with tracing.get_tracer().start_as_current_span("caller") as caller:
+        propagate.inject(carrier)
+    response = TestClient(app).get("/tracing-test/items/7", headers=carrier)
+
+    server = next(span for span in spans() if "http.request_id" in span.attributes)
+    assert server.name == "GET /tracing-test/items/{item_id}"
+    assert server.parent.span_id == caller.get_span_context().span_id
+    assert server.attributes["http.status_code"] == 200
+    assert response.json()["trace_id"] == caller.get_span_context().trace_id
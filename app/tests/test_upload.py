@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import time
+import pytest
+from fastapi import HTTPException
+from ..services.upload import HashingStream, UploadStream, sniff_content_type
+from .fixtures import PNG, make_request, multipart_body
+
+async def collect(upload: UploadStream) -> bytes:
+    await upload.start()
+    return b"".join([chunk async for chunk in upload])
+
+def test_sniff_content_type():
+    assert sniff_content_type(b"\xff\xd8\xff\xe0") == "image/jpeg"
+    assert sniff_content_type(b"%PDF-1.7") == "application/pdf"
+    assert sniff_content_type(b"MZ\x90\x00") is None
+
+def test_streams_file_field():
+    upload = UploadStream(make_request(multipart_body(PNG)))
+    assert asyncio.run(collect(upload)) == PNG
+    assert upload.filename == "image.png"
+    assert upload.content_type == "image/png"
+    assert upload.size == len(PNG)
+
+def test_rejects_oversized_file():
+    upload = UploadStream(make_request(multipart_body(PNG)), max_size=50_000)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(collect(upload))
+    assert exc.value.status_code == 413
+
+def test_rejects_spoofed_content_type():
+    upload = UploadStream(make_request(multipart_body(b"MZ" + b"\x00" * 100, "evil.png")))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(collect(upload))
+    assert exc.value.status_code == 400
+
+def test_missing_file_field():
+    upload = UploadStream(make_request(multipart_body(PNG, field="other")))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(collect(upload))
+    assert exc.value.status_code == 400
+
+def test_hashing_stream_digests_while_streaming():
+    content = PNG + b"x" * 100_000
+    upload = UploadStream(make_request(multipart_body(content)))
+    hashed = HashingStream(upload)
+
+    async def run():
+        await upload.start()
+        return b"".join([chunk async for chunk in hashed])
+
+    assert asyncio.run(run()) == content
+    assert hashed.hexdigest() == hashlib.sha256(content).hexdigest()
+
+@pytest.fixture
+def s3(monkeypatch):
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        from ..services.s3 import S3Service
+        service = S3Service()
+        service.bucket = "test-bucket"
+        service.s3_client.create_bucket(Bucket=service.bucket)
+        yield service
+
+async def chunked(data: bytes, size: int = 256 * 1024):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+def test_upload_stream_multipart(s3, monkeypatch):
+    from ..core.config import settings
+    monkeypatch.setattr(settings, "S3_MULTIPART_CHUNK_SIZE", 5 * 1024 * 1024)
+    data = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 48 * 1024
+
+    url = asyncio.run(s3.upload_stream(chunked(data), "uploads/big.png", "image/png"))
+
+    assert url.endswith("uploads/big.png")
+    stored = s3.s3_client.get_object(Bucket=s3.bucket, Key="uploads/big.png")
+    assert stored["ContentType"] == "image/png"
+    assert stored["Body"].read() == data
+
+def test_upload_stream_single_put(s3):
+    asyncio.run(s3.upload_stream(chunked(PNG), "uploads/small.png", "image/png"))
+    stored = s3.s3_client.get_object(Bucket=s3.bucket, Key="uploads/small.png")
+    assert stored["Body"].read() == PNG
+
+def test_upload_stream_aborts_on_error(s3, monkeypatch):
+    from ..core.config import settings
+    monkeypatch.setattr(settings, "S3_MULTIPART_CHUNK_SIZE", 5 * 1024 * 1024)
+
+    async def failing():
+        yield b"\x00" * (6 * 1024 * 1024)
+        raise HTTPException(status_code=413, detail="File too large")
+
+    with pytest.raises(HTTPException):
+        asyncio.run(s3.upload_stream(failing(), "uploads/aborted.png", "image/png"))
+    assert s3.s3_client.list_multipart_uploads(Bucket=s3.bucket).get("Uploads", []) == []
+
+def test_upload_stream_stops_at_first_failed_part(s3, monkeypatch):
+    from ..core.config import settings
+    monkeypatch.setattr(settings, "S3_MULTIPART_CHUNK_SIZE", 5 * 1024 * 1024)
+    monkeypatch.setattr(settings, "S3_MULTIPART_CONCURRENCY", 2)
+    upload_part = s3.s3_client.upload_part
+    finished, aborted_after = [], []
+
+    def flaky_upload_part(**kwargs):
+        if kwargs["PartNumber"] == 1:
+            raise RuntimeError("part failed")
+        time.sleep(0.05)
+        response = upload_part(**kwargs)
+        finished.append(kwargs["PartNumber"])
+        return response
+
+    abort = s3.s3_client.abort_multipart_upload
+
+    def tracked_abort(**kwargs):
+        aborted_after.append(list(finished))
+        return abort(**kwargs)
+
+    monkeypatch.setattr(s3.s3_client, "upload_part", flaky_upload_part)
+    monkeypatch.setattr(s3.s3_client, "abort_multipart_upload", tracked_abort)
+    read = []
+
+    async def body():
+        for i in range(10):
+            read.append(i)
+            yield b"\x00" * (5 * 1024 * 1024)
+            await asyncio.sleep(0.01)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(s3.upload_stream(body(), "uploads/failed.png", "image/png"))
+    assert len(read) < 10
+    # Every part that was still running had settled before the abort
+    assert aborted_after == [finished]
+    assert s3.s3_client.list_multipart_uploads(Bucket=s3.bucket).get("Uploads", []) == []
+
+def test_delete_keys_batches(s3, monkeypatch):
+    from ..services import s3 as s3_module
+    monkeypatch.setattr(s3_module, "DELETE_BATCH_SIZE", 2)
+    keys = [f"uploads/{i}.bin" for i in range(5)]
+    for key in keys:
+        s3.s3_client.put_object(Bucket=s3.bucket, Key=key, Body=b"x")
+    calls = []
+    delete_objects = s3.s3_client.delete_objects
+    monkeypatch.setattr(s3.s3_client, "delete_objects", lambda **kw: calls.append(kw) or delete_objects(**kw))
+
+    results = asyncio.run(s3.delete_keys(keys + keys[:1]))
+
+    assert results == {key: True for key in keys}
+    assert len(calls) == 3
+    assert s3.s3_client.list_objects_v2(Bucket=s3.bucket).get("KeyCount") == 0
@@ -0,0 +1,223 @@
+import asyncio
+import pytest
+from ..websockets.backplane import Backplane
+from ..websockets.connection import ConnectionManager
+from ..websockets.protocol import SUBPROTOCOLS, negotiate
+
+fakeredis = pytest.importorskip("fakeredis")
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0, subprotocols=()):
+        self.sent = []
+        self.delay = delay
+        self.close_code = None
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.subprotocol = None
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, message: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def send_bytes(self, data: bytes):
+        await self.send_text(data)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+async def wait_for(predicate, timeout: float = 1.0):
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    assert predicate()
+
+def test_messages_reach_sockets_on_other_pods():
+    server = fakeredis.FakeServer()
+
+    def make_pod():
+        return ConnectionManager(Backplane(fakeredis.aioredis.FakeRedis(server=server), "ws:test"))
+
+    async def run():
+        pod_a, pod_b = make_pod(), make_pod()
+        await pod_a.backplane.start()
+        await pod_b.backplane.start()
+        try:
+            alice, bob = FakeWebSocket(), FakeWebSocket()
+            await pod_a.connect(alice, 1)
+            await pod_b.connect(bob, 2)
+            await asyncio.sleep(0.05)
+
+            await pod_a.send_personal_message("hi bob", 2)
+            await wait_for(lambda: bob.sent == ["hi bob"])
+            assert alice.sent == []
+
+            await pod_b.broadcast("hello all")
+            await wait_for(lambda: alice.sent == ["hello all"] and bob.sent[-1] == "hello all")
+
+            await pod_b.disconnect(bob, 2)
+            assert pod_b.backplane.user_channel(2) not in pod_b.backplane._channels
+        finally:
+            await pod_a.backplane.stop()
+            await pod_b.backplane.stop()
+
+    asyncio.run(run())
+
+def test_without_backplane_delivers_locally():
+    async def run():
+        manager = ConnectionManager()
+        socket = FakeWebSocket()
+        await manager.connect(socket, 1)
+        await manager.send_personal_message("direct", 1)
+        await manager.broadcast({"type": "notice"})
+        await wait_for(lambda: socket.sent == ["direct", '{"type": "notice"}'])
+        await manager.disconnect(socket, 1)
+        assert manager.active_connections == {}
+
+    asyncio.run(run())
+
+def test_slow_consumer_does_not_block_others():
+    async def run():
+        manager = ConnectionManager(max_queue=2, policy="drop_oldest")
+        slow, fast = FakeWebSocket(delay=10), FakeWebSocket()
+        await manager.connect(slow, 1)
+        await manager.connect(fast, 2)
+
+        for i in range(5):
+            await manager.broadcast(f"m{i}")
+            await asyncio.sleep(0)
+        await wait_for(lambda: len(fast.sent) == 5)
+
+        slow_connection = manager.active_connections[1][0]
+        # m0 went to the writer, the queue kept only the newest two
+        assert list(slow_connection.queue._queue) == ["m3", "m4"]
+        await manager.disconnect(slow, 1)
+        await manager.disconnect(fast, 2)
+
+    asyncio.run(run())
+
+def test_drop_newest_policy_keeps_queued_messages():
+    async def run():
+        manager = ConnectionManager(max_queue=1, policy="drop_newest")
+        slow = FakeWebSocket(delay=10)
+        connection = await manager.connect(slow, 1)
+        await manager.send_personal_message("m0", 1)
+        await asyncio.sleep(0)
+        for i in range(1, 3):
+            await manager.send_personal_message(f"m{i}", 1)
+        assert list(connection.queue._queue) == ["m1"]
+        await manager.disconnect(slow, 1)
+
+    asyncio.run(run())
+
+def test_disconnect_policy_closes_slow_consumer():
+    async def run():
+        manager = ConnectionManager(max_queue=1, policy="disconnect")
+        slow = FakeWebSocket(delay=10)
+        await manager.connect(slow, 1)
+        await asyncio.sleep(0)
+        for i in range(3):
+            await manager.send_personal_message(f"m{i}", 1)
+
+        await wait_for(lambda: slow.close_code == 1013)
+        assert manager.active_connections == {}
+
+    asyncio.run(run())
+
+def test_failed_send_removes_connection():
+    class BrokenWebSocket(FakeWebSocket):
+        async def send_text(self, message: str):
+            raise RuntimeError("connection reset")
+
+    async def run():
+        manager = ConnectionManager()
+        healthy = FakeWebSocket()
+        await manager.connect(BrokenWebSocket(), 1)
+        await manager.connect(healthy, 2)
+        await manager.broadcast("ping")
+        await wait_for(lambda: healthy.sent == ["ping"] and 1 not in manager.active_connections)
+
+    asyncio.run(run())
+
+def test_quiet_sockets_are_left_to_protocol_pings():
+    async def run():
+        manager = ConnectionManager()
+        quiet = FakeWebSocket()
+        await manager.connect(quiet, 1)
+        await asyncio.sleep(0.05)
+        assert quiet.sent == [] and quiet.close_code is None
+        assert manager.connection_count == 1
+
+    asyncio.run(run())
+
+def test_rejected_handshake_delivers_close_code(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+    from ..api.v1.endpoints import websocket as endpoint
+
+    async def no_user(websocket, token):
+        return None
+
+    monkeypatch.setattr(endpoint, "authenticate_websocket", no_user)
+    app = FastAPI()
+    app.include_router(endpoint.router)
+    with TestClient(app) as client:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with client.websocket_connect("/ws") as ws:
+                ws.receive_text()
+    assert exc.value.code == 1008
+
+def test_connection_cap():
+    async def run():
+        manager = ConnectionManager(max_connections=2)
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(first, 1)
+        assert not manager.at_capacity()
+        await manager.connect(second, 1)
+        assert manager.at_capacity()
+        await manager.disconnect(first, 1)
+        assert not manager.at_capacity()
+
+    asyncio.run(run())
+
+def test_negotiates_first_supported_subprotocol():
+    assert negotiate(["mqtt", "json.batch", "msgpack.batch"]).name == "json.batch"
+    assert negotiate(["mqtt"]).name is None
+
+def test_msgpack_frames_batch_messages():
+    msgpack = pytest.importorskip("msgpack")
+    codec = SUBPROTOCOLS["msgpack.batch"]
+    items = [codec.encode(f'{{"n": {i}}}') for i in range(20)] + [codec.encode("plain notice")]
+    assert msgpack.unpackb(codec.frame(items)) == [{"n": i} for i in range(20)] + ["plain notice"]
+    assert codec.decode(msgpack.packb({"type": "ping"})) == [{"type": "ping"}]
+
+def test_msgpack_rejects_text_and_malformed_frames():
+    msgpack = pytest.importorskip("msgpack")
+    codec = SUBPROTOCOLS["msgpack.batch"]
+    for frame in ('{"type": "ping"}', b"\xc1", msgpack.packb({(1, 2): "x"}, use_bin_type=True)):
+        with pytest.raises(ValueError):
+            codec.decode(frame)
+
+def test_coalesces_messages_within_window():
+    async def run():
+        manager = ConnectionManager(coalesce_window=0.05, coalesce_max=3)
+        legacy = FakeWebSocket()
+        batched = FakeWebSocket(subprotocols=["json.batch"])
+        packed = FakeWebSocket(subprotocols=["msgpack.batch"])
+        for user_id, socket in enumerate((legacy, batched, packed)):
+            await manager.connect(socket, user_id)
+        assert batched.subprotocol == "json.batch"
+
+        for i in range(4):
+            await manager.broadcast({"n": i})
+        await wait_for(lambda: len(legacy.sent) == 4 and len(batched.sent) == 2 and len(packed.sent) == 2)
+
+        assert legacy.sent[0] == '{"n": 0}'
+        assert batched.sent == ['[{"n": 0},{"n": 1},{"n": 2}]', '[{"n": 3}]']
+        assert SUBPROTOCOLS["msgpack.batch"].decode(packed.sent[0]) == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+    asyncio.run(run())
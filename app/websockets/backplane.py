@@ -0,0 +1,113 @@
+from typing import Awaitable, Callable, Optional, Set
+import asyncio
+import logging
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from ..core.config import settings
+from ..core.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# handler(user_id, message); user_id is None for broadcasts
+MessageHandler = Callable[[Optional[int], str], Awaitable[None]]
+
+# Relays WebSocket messages between pods over Redis pub/sub. Each process
+# keeps a single subscriber connection: the broadcast channel is always
+# subscribed, a user's channel only while that user has a socket here.
+class Backplane:
+    def __init__(self, redis: Redis, prefix: str):
+        self.redis = redis
+        self.prefix = prefix
+        self.broadcast_channel = f"{prefix}:broadcast"
+        self._handler: Optional[MessageHandler] = None
+        self._channels: Set[str] = set()
+        self._pubsub: Optional[PubSub] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def user_channel(self, user_id: int) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    def set_handler(self, handler: MessageHandler) -> None:
+        self._handler = handler
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def publish(self, channel: str, message: str) -> bool:
+        try:
+            await self.redis.publish(channel, message)
+            return True
+        except Exception as e:
+            logger.error(f"WebSocket backplane publish error: {e}")
+            return False
+
+    async def subscribe_user(self, user_id: int) -> None:
+        channel = self.user_channel(user_id)
+        self._channels.add(channel)
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.subscribe(channel)
+            except Exception as e:
+                # The listener resubscribes everything when it reconnects
+                logger.error(f"WebSocket backplane subscribe error: {e}")
+
+    async def unsubscribe_user(self, user_id: int) -> None:
+        channel = self.user_channel(user_id)
+        self._channels.discard(channel)
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(channel)
+            except Exception as e:
+                logger.error(f"WebSocket backplane unsubscribe error: {e}")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _target(self, channel: str) -> Optional[int]:
+        if channel == self.broadcast_channel:
+            return None
+        return int(channel.rsplit(":", 1)[1])
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                self._pubsub = pubsub
+                await pubsub.subscribe(self.broadcast_channel, *self._channels)
+                async for message in pubsub.listen():
+                    channel = message["channel"]
+                    data = message["data"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    if isinstance(data, bytes):
+                        data = data.decode()
+                    if self._handler is None:
+                        continue
+                    try:
+                        await self._handler(self._target(channel), data)
+                    except Exception as e:
+                        logger.error(f"WebSocket backplane handler error: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket backplane listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                self._pubsub = None
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+backplane = Backplane(redis_client, settings.WS_CHANNEL_PREFIX)
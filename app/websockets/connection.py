@@ -1,32 +1,251 @@
-from fastapi import WebSocket, Depends, WebSocketDisconnect
-from typing import List, Dict
-from ..api.deps import get_current_user
-from ..models.user import User
+from fastapi import WebSocket
+from typing import Any, Callable, List, Dict, Optional, Set, Union
+import asyncio
+import json
+import logging
+from .backplane import Backplane, backplane as default_backplane
+from .protocol import LEGACY, Codec, Frame, negotiate
+from ..core.config import settings
+from ..monitoring.prometheus import (
+    WS_CONNECTIONS,
+    WS_DROPPED_MESSAGES,
+    WS_QUEUED_MESSAGES,
+    WS_QUEUE_DEPTH
+)
+
+logger = logging.getLogger(__name__)
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "drop_newest", "disconnect")
+
+# Close code sent to consumers that can't keep up (1013 = try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class Connection:
+    # One socket with its own bounded outbound queue. A writer task drains the
+    # queue, so senders never wait on the network and one slow client can't
+    # hold up anyone else.
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        max_queue: int,
+        policy: str,
+        on_close: Callable[["Connection"], None],
+        codec: Codec = LEGACY,
+        coalesce_window: float = 0,
+        coalesce_max: int = 1
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {policy}")
+        self.websocket = websocket
+        self.user_id = user_id
+        self.policy = policy
+        self.codec = codec
+        self.coalesce_window = coalesce_window
+        self.coalesce_max = coalesce_max
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.closed = False
+        self._finished = False
+        self._on_close = on_close
+        self._writer_task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._writer_task = asyncio.create_task(self._writer())
+
+    def send(self, message: str) -> bool:
+        return self.enqueue(self.codec.encode(message))
+
+    def enqueue(self, message: Frame) -> bool:
+        if self.closed:
+            return False
+        WS_QUEUE_DEPTH.observe(self.queue.qsize())
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            WS_DROPPED_MESSAGES.labels(policy=self.policy).inc()
+            if self.policy == "drop_newest":
+                return False
+            if self.policy == "disconnect":
+                logger.warning(f"Disconnecting slow WebSocket consumer for user {self.user_id}")
+                self.stop(SLOW_CONSUMER_CLOSE_CODE)
+                return False
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            return True
+        WS_QUEUED_MESSAGES.inc()
+        return True
+
+    async def _writer(self) -> None:
+        try:
+            while True:
+                items = [await self.queue.get()]
+                if self.codec.batched:
+                    # Give closely spaced messages a moment to share one frame
+                    if self.coalesce_window > 0 and self.queue.qsize() < self.coalesce_max - 1:
+                        await asyncio.sleep(self.coalesce_window)
+                    while len(items) < self.coalesce_max and not self.queue.empty():
+                        items.append(self.queue.get_nowait())
+                WS_QUEUED_MESSAGES.dec(len(items))
+                frame = self.codec.frame(items)
+                if self.codec.binary:
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"WebSocket send failed for user {self.user_id}: {e}")
+        finally:
+            self._finish()
+
+    def _finish(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        self.closed = True
+        WS_QUEUED_MESSAGES.dec(self.queue.qsize())
+        self._on_close(self)
+
+    def stop(self, close_code: Optional[int] = None) -> None:
+        # Idempotent; also unregisters the connection from the manager
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+        if close_code is not None:
+            self._close_task = asyncio.create_task(self._close(close_code))
+        self._finish()
+
+    async def _close(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+    # Sockets are held per process; messages travel through the backplane so
+    # they reach the user's sockets on whichever pod they are connected to.
+    # Liveness is left to protocol-level ping/pong (uvicorn --ws-ping-*), which
+    # every client answers; a dead peer surfaces as a disconnect in receive().
+    def __init__(
+        self,
+        backplane: Optional[Backplane] = None,
+        max_queue: int = None,
+        policy: str = None,
+        max_connections: int = None,
+        coalesce_window: float = None,
+        coalesce_max: int = None
+    ):
+        self.active_connections: Dict[int, List[Connection]] = {}
+        self.backplane = backplane
+        self.max_queue = max_queue or settings.WS_SEND_QUEUE_SIZE
+        self.policy = policy or settings.WS_SLOW_CONSUMER_POLICY
+        self.max_connections = max_connections or settings.WS_MAX_CONNECTIONS
+        self.coalesce_window = settings.WS_COALESCE_WINDOW if coalesce_window is None else coalesce_window
+        self.coalesce_max = coalesce_max or settings.WS_COALESCE_MAX_MESSAGES
+        self.connection_count = 0
+        self._background: Set[asyncio.Task] = set()
+        if backplane is not None:
+            backplane.set_handler(self._deliver)
+
+    def at_capacity(self) -> bool:
+        return self.connection_count >= self.max_connections
 
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, user_id: int) -> Connection:
+        codec = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=codec.name)
+        connection = Connection(
+            websocket,
+            user_id,
+            self.max_queue,
+            self.policy,
+            self._on_connection_closed,
+            codec=codec,
+            coalesce_window=self.coalesce_window,
+            coalesce_max=self.coalesce_max
+        )
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+            if self.backplane is not None:
+                await self.backplane.subscribe_user(user_id)
+        self.active_connections[user_id].append(connection)
+        connection.start()
+        self.connection_count += 1
+        WS_CONNECTIONS.inc()
+        return connection
+
+    def _remove(self, connection: Connection) -> bool:
+        # Returns True when this was the user's last socket on this pod
+        user_connections = self.active_connections.get(connection.user_id)
+        if not user_connections or connection not in user_connections:
+            return False
+        user_connections.remove(connection)
+        self.connection_count -= 1
+        WS_CONNECTIONS.dec()
+        if user_connections:
+            return False
+        del self.active_connections[connection.user_id]
+        return True
+
+    async def _unsubscribe_if_idle(self, user_id: int) -> None:
+        # The user may have reconnected while this was pending
+        if self.backplane is not None and user_id not in self.active_connections:
+            await self.backplane.unsubscribe_user(user_id)
+
+    def _on_connection_closed(self, connection: Connection) -> None:
+        # Runs in the writer task when the socket fails or is stopped
+        if self._remove(connection):
+            task = asyncio.create_task(self._unsubscribe_if_idle(connection.user_id))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def disconnect(self, websocket: WebSocket, user_id: int):
+        for connection in list(self.active_connections.get(user_id, [])):
+            if connection.websocket is websocket:
+                connection.stop()
+        await self._unsubscribe_if_idle(user_id)
+
+    @staticmethod
+    def encode(message: Union[str, Any]) -> str:
+        return message if isinstance(message, str) else json.dumps(message)
+
+    def _enqueue_all(self, message: str, connections: List[Connection]) -> None:
+        # Each wire format is encoded at most once per message
+        encoded: Dict[Codec, Frame] = {}
+        for connection in list(connections):
+            codec = connection.codec
+            if codec not in encoded:
+                encoded[codec] = codec.encode(message)
+            connection.enqueue(encoded[codec])
 
-    def disconnect(self, websocket: WebSocket, user_id: int):
-        if user_id in self.active_connections:
-            self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
+    async def _deliver(self, user_id: Optional[int], message: str):
+        # Called by the backplane for every message routed to this pod. Only
+        # enqueues, so the subscriber never waits on a socket.
+        if user_id is None:
+            self._enqueue_all(message, [
+                connection
+                for user_connections in list(self.active_connections.values())
+                for connection in user_connections
+            ])
+        elif user_id in self.active_connections:
+            self._enqueue_all(message, self.active_connections[user_id])
 
-    async def send_personal_message(self, message: str, user_id: int):
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                await connection.send_text(message)
+    async def send_personal_message(self, message: Union[str, Any], user_id: int):
+        message = self.encode(message)
+        if self.backplane is not None and self.backplane.running:
+            if await self.backplane.publish(self.backplane.user_channel(user_id), message):
+                return
+        # No backplane: only sockets on this pod can be reached
+        await self._deliver(user_id, message)
 
-    async def broadcast(self, message: str):
-        for user_connections in self.active_connections.values():
-            for connection in user_connections:
-                await connection.send_text(message)
+    async def broadcast(self, message: Union[str, Any]):
+        # Serialized once here, whatever the number of recipients
+        message = self.encode(message)
+        if self.backplane is not None and self.backplane.running:
+            if await self.backplane.publish(self.backplane.broadcast_channel, message):
+                return
+        await self._deliver(None, message)
 
-manager = ConnectionManager()
+manager = ConnectionManager(default_backplane)
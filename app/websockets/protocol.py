@@ -0,0 +1,76 @@
+from typing import Any, List, Optional, Sequence, Union
+import json
+import struct
+import msgpack
+
+Frame = Union[str, bytes]
+
+# Wire formats. Messages travel between pods as JSON text; each codec turns
+# that text into its own encoding once per message, and several encoded
+# messages can share one frame.
+class Codec:
+    name: Optional[str] = None  # negotiated subprotocol; None for legacy clients
+    binary = False
+    batched = False  # frames carry an array of messages
+
+    def encode(self, message: str) -> Frame:
+        return message
+
+    def frame(self, items: Sequence[Frame]) -> Frame:
+        # Legacy clients get exactly one message per frame
+        return items[0]
+
+    def decode(self, data: Frame) -> List[Any]:
+        message = json.loads(data)
+        return message if isinstance(message, list) and self.batched else [message]
+
+class JsonBatchCodec(Codec):
+    name = "json.batch"
+    batched = True
+
+    def frame(self, items: Sequence[Frame]) -> Frame:
+        # Items are already JSON, so joining them builds the array without re-encoding
+        return "[" + ",".join(items) + "]"
+
+class MsgpackBatchCodec(Codec):
+    name = "msgpack.batch"
+    binary = True
+    batched = True
+
+    def encode(self, message: str) -> Frame:
+        try:
+            value = json.loads(message)
+        except ValueError:
+            value = message  # plain text notices
+        return msgpack.packb(value, use_bin_type=True)
+
+    def frame(self, items: Sequence[Frame]) -> Frame:
+        # A msgpack array is a length header followed by its packed elements
+        count = len(items)
+        if count < 16:
+            header = bytes([0x90 | count])
+        elif count < 0x10000:
+            header = b"\xdc" + struct.pack(">H", count)
+        else:
+            header = b"\xdd" + struct.pack(">I", count)
+        return header + b"".join(items)
+
+    def decode(self, data: Frame) -> List[Any]:
+        # Text frames and undecodable payloads are rejected like bad JSON
+        if not isinstance(data, bytes):
+            raise ValueError("msgpack.batch expects binary frames")
+        try:
+            message = msgpack.unpackb(data, raw=False)
+        except TypeError as e:  # e.g. a map keyed by an unhashable value
+            raise ValueError(str(e)) from e
+        return message if isinstance(message, list) else [message]
+
+LEGACY = Codec()
+SUBPROTOCOLS = {codec.name: codec for codec in (MsgpackBatchCodec(), JsonBatchCodec())}
+
+def negotiate(offered: Sequence[str]) -> Codec:
+    # First subprotocol offered by the client that we speak, in its order of preference
+    for name in offered:
+        if name in SUBPROTOCOLS:
+            return SUBPROTOCOLS[name]
+    return LEGACY
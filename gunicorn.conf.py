@@ -0,0 +1,35 @@
+# Production server: gunicorn supervising uvicorn workers. Each worker writes
+# its metrics to PROMETHEUS_MULTIPROC_DIR and /metrics on any of them reports
+# the sum (see app/monitoring/prometheus.py).
+import os
+import shutil
+from prometheus_client import multiprocess
+from uvicorn.workers import UvicornWorker
+from app.core.config import settings
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+
+class WebSocketWorker(UvicornWorker):
+    # Same WebSocket options as uvicorn.run in main.py
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "ws": "websockets",
+        "ws_per_message_deflate": settings.WS_PER_MESSAGE_DEFLATE,
+        "ws_ping_interval": settings.WS_PING_INTERVAL,
+        "ws_ping_timeout": settings.WS_PING_TIMEOUT
+    }
+
+worker_class = WebSocketWorker
+
+def on_starting(server):
+    # Files left by a previous run would be summed into the new one
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+def child_exit(server, worker):
+    # Drops the exited worker from live gauges (connections, queue depth)
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -5,23 +6,47 @@ from app.core.config import settings
 from app.api.v1.api import api_router
 from app.api.errors.http_error import http_error_handler
 from starlette.exceptions import HTTPException
-from app.middleware.logging import logging_middleware
-from app.monitoring.prometheus import metrics_middleware
-from app.middleware.version import version_middleware
+from app.middleware.logging import start_access_log, stop_access_log
+from app.middleware.observability import ObservabilityMiddleware
+from app.monitoring.tracing import setup_tracing
+from app.cache.invalidation import invalidation_bus
+from app.websockets.backplane import backplane
+from app.services.mail import preload_templates
+from app.services.email import flush_email_queue, mail_pool
+from app.tasks.worker import upload_batcher
 import uvicorn
 
+# No-op unless TRACING_ENABLED is set
+setup_tracing()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Access log lines are formatted and written on a background thread
+    start_access_log()
+    preload_templates()
+    # Keeps in-process caches coherent with writes made on other pods
+    await invalidation_bus.start()
+    # Routes WebSocket messages published by any pod to sockets held here
+    await backplane.start()
+    yield
+    await backplane.stop()
+    await invalidation_bus.stop()
+    await flush_email_queue()
+    await upload_batcher.flush()
+    await mail_pool.close()
+    stop_access_log()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     docs_url=f"{settings.API_V1_STR}/docs",
     redoc_url=f"{settings.API_V1_STR}/redoc",
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Middleware
-app.middleware("http")(logging_middleware)
-app.middleware("http")(metrics_middleware)
-app.middleware("http")(version_middleware)
+app.add_middleware(ObservabilityMiddleware)
 
 # Exception handlers
 app.add_exception_handler(HTTPException, http_error_handler)
@@ -47,4 +72,13 @@ async def health_check():
     return {"status": "healthy", "version": settings.VERSION}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
\ No newline at end of file
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8001,
+        reload=True,
+        ws="websockets",
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE,
+        ws_ping_interval=settings.WS_PING_INTERVAL,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT
+    )
\ No newline at end of file
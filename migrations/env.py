@@ -6,6 +6,7 @@ from app.core.config import settings
 from app.models.user import Base
 from app.models.profile import Profile
 from app.models.file import File
+from app.models.blob import Blob
 
 config = context.config
 
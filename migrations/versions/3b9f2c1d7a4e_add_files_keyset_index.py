@@ -0,0 +1,38 @@
+"""add files keyset index
+
+Revision ID: 3b9f2c1d7a4e
+Revises: 
+Create Date: 2026-10-17 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9f2c1d7a4e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY avoids locking files for writes while the index builds
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_files_user_id_created_at_id",
+            "files",
+            ["user_id", "created_at", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_files_user_id_created_at_id",
+            table_name="files",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,42 @@
+"""add content addressed blobs
+
+Revision ID: 8d41e6b0c2f5
+Revises: 3b9f2c1d7a4e
+Create Date: 2026-10-17 14:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41e6b0c2f5'
+down_revision = '3b9f2c1d7a4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("storage_key", sa.String(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=True),
+        sa.Column("mime_type", sa.String(), nullable=True),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_blobs_sha256", "blobs", ["sha256"], unique=True)
+
+    op.add_column("files", sa.Column("blob_id", sa.Integer(), nullable=True))
+    op.create_foreign_key("fk_files_blob_id_blobs", "files", "blobs", ["blob_id"], ["id"])
+    op.create_index("ix_files_blob_id", "files", ["blob_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_files_blob_id", table_name="files")
+    op.drop_constraint("fk_files_blob_id_blobs", "files", type_="foreignkey")
+    op.drop_column("files", "blob_id")
+    op.drop_index("ix_blobs_sha256", table_name="blobs")
+    op.drop_table("blobs")
@@ -0,0 +1,26 @@
+"""add image variants
+
+Revision ID: c7a2e94f1b38
+Revises: 8d41e6b0c2f5
+Create Date: 2026-10-17 16:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a2e94f1b38'
+down_revision = '8d41e6b0c2f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("files", sa.Column("variants", sa.JSON(none_as_null=True), nullable=True))
+    op.add_column("profiles", sa.Column("avatar_variants", sa.JSON(none_as_null=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("profiles", "avatar_variants")
+    op.drop_column("files", "variants")